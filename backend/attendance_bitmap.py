@@ -0,0 +1,181 @@
+"""
+Compact attendance storage: one document per student, subject and semester
+holding two bit arrays over the semester's day offsets (recorded, present)
+plus a small map for holiday/event statuses. Writes are read-modify-write
+with a version check; a stale version makes the upsert collide with the
+unique key, so conflicting rows are simply re-read and retried
+"""
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import Binary
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from semester import SEMESTER_START, SEMESTER_END
+
+BITMAP_KEY = ("student_id", "subject_code", "term_start")
+BITMAP_INDEX = [(field, 1) for field in BITMAP_KEY]
+
+# Statuses stored as bits; anything else goes to the exceptions map
+BIT_STATUSES = ("present", "absent")
+
+MAX_WRITE_ATTEMPTS = 5
+
+
+def term_start_for(day: str) -> Optional[str]:
+    """Semester a record date belongs to, or None if it cannot be packed"""
+    try:
+        parsed = date.fromisoformat(str(day)[:10])
+    except ValueError:
+        return None
+    return SEMESTER_START.isoformat() if SEMESTER_START <= parsed <= SEMESTER_END else None
+
+
+def _offset(doc: dict, day: str) -> int:
+    return (date.fromisoformat(day[:10]) - date.fromisoformat(doc["term_start"])).days
+
+
+def _as_int(value) -> int:
+    return int.from_bytes(bytes(value or b""), "little")
+
+
+def _as_binary(value: int) -> Binary:
+    return Binary(value.to_bytes((value.bit_length() + 7) // 8, "little"))
+
+
+class PackedAttendance:
+    """Decoded bit arrays of one bitmap document"""
+
+    def __init__(self, doc: Optional[dict]):
+        doc = doc or {}
+        self.version = doc.get("version", 0)
+        self.recorded = _as_int(doc.get("recorded"))
+        self.present = _as_int(doc.get("present"))
+        self.exceptions: Dict[str, str] = dict(doc.get("exceptions") or {})
+
+    def status(self, offset: int) -> Optional[str]:
+        if not self.recorded >> offset & 1:
+            return None
+        if str(offset) in self.exceptions:
+            return self.exceptions[str(offset)]
+        return "present" if self.present >> offset & 1 else "absent"
+
+    def set(self, offset: int, status: str):
+        status = getattr(status, "value", status)
+        bit = 1 << offset
+        self.recorded |= bit
+        if status == "present":
+            self.present |= bit
+        else:
+            self.present &= ~bit
+        if status in BIT_STATUSES:
+            self.exceptions.pop(str(offset), None)
+        else:
+            self.exceptions[str(offset)] = status
+
+    def offsets(self) -> List[int]:
+        value, offsets = self.recorded, []
+        while value:
+            low = value & -value
+            offsets.append(low.bit_length() - 1)
+            value ^= low
+        return offsets
+
+    def update(self) -> dict:
+        return {"$set": {
+            "recorded": _as_binary(self.recorded),
+            "present": _as_binary(self.present),
+            "exceptions": self.exceptions,
+            "version": self.version + 1,
+        }}
+
+
+def totals(doc: dict) -> Tuple[int, int]:
+    """(total, present) straight from the bit counts"""
+    packed = PackedAttendance(doc)
+    return bin(packed.recorded).count("1"), bin(packed.present).count("1")
+
+
+def expand(doc: dict) -> List[dict]:
+    """Per-day records in the same shape as the document storage mode"""
+    packed = PackedAttendance(doc)
+    start = date.fromisoformat(doc["term_start"])
+    return [
+        {
+            "id": f"{doc['_id']}:{offset}",
+            "student_id": doc["student_id"],
+            "subject_code": doc["subject_code"],
+            "date": (start + timedelta(days=offset)).isoformat(),
+            "status": packed.status(offset),
+        }
+        for offset in packed.offsets()
+    ]
+
+
+async def find_records(db, student_id: Optional[str] = None, subject_code: Optional[str] = None,
+                       day: Optional[str] = None) -> List[dict]:
+    query = {}
+    if student_id is not None:
+        query["student_id"] = student_id
+    if subject_code is not None:
+        query["subject_code"] = subject_code
+    if day is not None:
+        term_start = term_start_for(day)
+        if term_start is None:
+            return []
+        query["term_start"] = term_start
+
+    records = []
+    async for doc in db.attendance_bitmaps.find(query):
+        rows = expand(doc)
+        records.extend(r for r in rows if day is None or r["date"] == day[:10])
+    return records
+
+
+async def write_records(db, records: List[dict]) -> List[Tuple[str, Optional[str]]]:
+    """
+    Pack `records` (distinct keys, all inside the semester window) into their
+    bitmap documents. Returns (outcome, previous status) per record, where
+    outcome is inserted, updated or error.
+    """
+    results: List[Optional[Tuple[str, Optional[str]]]] = [None] * len(records)
+    groups: Dict[tuple, List[int]] = {}
+    for i, record in enumerate(records):
+        key = (record["student_id"], record["subject_code"], term_start_for(record["date"]))
+        groups.setdefault(key, []).append(i)
+
+    pending = list(groups)
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        if not pending:
+            break
+        existing = {}
+        query = {field: {"$in": list({key[n] for key in pending})} for n, field in enumerate(BITMAP_KEY)}
+        async for doc in db.attendance_bitmaps.find(query):
+            existing[tuple(doc[field] for field in BITMAP_KEY)] = doc
+
+        ops, attempted = [], []
+        for key in pending:
+            doc = existing.get(key) or dict(zip(BITMAP_KEY, key))
+            packed = PackedAttendance(doc)
+            for i in groups[key]:
+                offset = _offset(doc, records[i]["date"])
+                previous = packed.status(offset)
+                results[i] = ("inserted" if previous is None else "updated", previous)
+                packed.set(offset, records[i]["status"])
+            # Filtering on the version read makes a concurrent writer's update
+            # turn this upsert into a duplicate-key error instead of a lost write
+            ops.append(UpdateOne({**dict(zip(BITMAP_KEY, key)), "version": packed.version},
+                                 packed.update(), upsert=True))
+            attempted.append(key)
+
+        conflicts = set()
+        try:
+            await db.attendance_bitmaps.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            conflicts = {err["index"] for err in e.details.get("writeErrors", [])}
+        pending = [key for n, key in enumerate(attempted) if n in conflicts]
+
+    for key in pending:
+        for i in groups[key]:
+            results[i] = ("error", None)
+    return results
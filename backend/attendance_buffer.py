@@ -0,0 +1,79 @@
+"""
+Write-behind buffer for single attendance clicks. Updates are coalesced per
+(student_id, subject_code, date) over a short window, so a teacher toggling
+a student twice costs one write, and a whole roll call taken one click at a
+time is flushed as one bulk upsert through attendance_store.
+"""
+
+import asyncio
+from typing import Dict, Optional
+
+from config import settings
+from attendance_store import ATTENDANCE_KEY, ingest_attendance
+
+
+class AttendanceBuffer:
+    """In-process, per-worker write-behind queue of attendance rows"""
+
+    def __init__(self, window_seconds: float = 0.25, max_pending: int = 5000):
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[tuple, dict] = {}
+        self._db = None
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def write(self, db, record: dict, sync: bool = False):
+        """
+        Queue `record`; a later write for the same key replaces it. With
+        sync=True (or a zero window) everything pending, this record
+        included, is written before returning, for read-your-writes callers.
+        """
+        self._db = db
+        self._pending[tuple(record[field] for field in ATTENDANCE_KEY)] = record
+        if sync or self.window_seconds <= 0 or len(self._pending) >= self.max_pending:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Keep going until nothing is pending: clicks that arrive while a
+        # flush is in flight see this timer still running and do not start
+        # their own, and rows put back by a failed flush need a retry
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Attendance write-behind flush failed: {e}")
+            if not self._pending:
+                break
+
+    async def flush(self) -> int:
+        """Write everything pending as one bulk upsert; returns rows written"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            try:
+                await ingest_attendance(self._db, list(batch.values()))
+            except BaseException:
+                # Put the rows back unless newer clicks superseded them (also
+                # when close() cancels a timer mid-flush, so they are rewritten)
+                for key, record in batch.items():
+                    self._pending.setdefault(key, record)
+                raise
+            return len(batch)
+
+    async def close(self):
+        """Flush on shutdown so queued clicks are not lost"""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+        await self.flush()
+
+
+attendance_buffer = AttendanceBuffer(window_seconds=settings.ATTENDANCE_WRITE_BEHIND_MS / 1000)
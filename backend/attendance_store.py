@@ -0,0 +1,475 @@
+"""
+Attendance storage helpers shared by the attendance, teacher and optimization
+routers: idempotent (bulk) ingestion and the attendance_stats counters,
+kept per (student_id, subject_code, semester) with $inc on every write.
+With ATTENDANCE_STORAGE_MODE="bitmap", rows inside the semester window are
+packed into attendance_bitmaps instead of one document per day
+"""
+
+import base64
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from config import settings
+import attendance_bitmap
+
+# One attendance row per student, subject and day
+ATTENDANCE_KEY = ("student_id", "subject_code", "date")
+ATTENDANCE_INDEX = [(field, 1) for field in ATTENDANCE_KEY]
+STATS_INDEX = [("student_id", 1), ("subject_code", 1), ("semester", 1)]
+
+# Operations per bulk_write round trip
+BULK_CHUNK_SIZE = 1000
+
+# Fields a history client may project; id and date are always returned
+HISTORY_FIELDS = ("student_id", "subject_code", "date", "status")
+HISTORY_BATCH_SIZE = 500
+
+# Lock documents (in db.config) held by the one process doing a maintenance
+# step; a crashed holder's lock is taken over once it expires
+STATS_REBUILD_LOCK = "attendance_stats_rebuild"
+INDEX_MIGRATION_LOCK = "attendance_index_migration"
+DATE_MIGRATION_LOCK = "attendance_date_migration"
+# Set once every row's date is an ISO string, so later startups skip the scan
+DATES_NORMALISED_FLAG = "attendance_dates_normalised"
+MAINTENANCE_LOCK_SECONDS = 600
+
+
+def bitmap_mode() -> bool:
+    return settings.ATTENDANCE_STORAGE_MODE == "bitmap"
+
+
+def _packable(record: dict) -> bool:
+    return bitmap_mode() and attendance_bitmap.term_start_for(record["date"]) is not None
+
+
+def _totals_pipeline(match: dict) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"student_id": "$student_id", "subject_code": "$subject_code"},
+            "total": {"$sum": 1},
+            "present": {"$sum": {"$cond": [{"$eq": ["$status", "present"]}, 1, 0]}},
+        }},
+    ]
+
+
+async def subject_totals(db, student_id: str, subject_code: Optional[str] = None,
+                         semester: Optional[int] = None) -> Dict[str, Tuple[int, int]]:
+    """
+    (total, present) per subject for one student, read from the pre-aggregated
+    attendance_stats counters (all semesters unless one is given)
+    """
+    query = {"student_id": student_id}
+    if subject_code is not None:
+        query["subject_code"] = subject_code
+    if semester is not None:
+        query["semester"] = semester
+    totals = {}
+    async for row in db.attendance_stats.find(query, {"_id": 0, "subject_code": 1, "total": 1, "present": 1}):
+        total, present = totals.get(row["subject_code"], (0, 0))
+        totals[row["subject_code"]] = (total + row.get("total", 0), present + row.get("present", 0))
+    return totals
+
+
+async def student_semesters(db, student_ids: Iterable[str]) -> Dict[str, Optional[int]]:
+    """Current semester per student (students collection, then login accounts)"""
+    ids = set(student_ids)
+    semesters = {}
+    async for doc in db.students.find({"student_id": {"$in": list(ids)}}, {"student_id": 1, "semester": 1}):
+        semesters[doc["student_id"]] = doc.get("semester")
+    missing = ids - semesters.keys()
+    if missing:
+        async for doc in db.users.find({"username": {"$in": list(missing)}, "role": "student"},
+                                       {"username": 1, "semester": 1}):
+            semesters[doc["username"]] = doc.get("semester")
+    return {student_id: semesters.get(student_id) for student_id in ids}
+
+
+async def apply_stat_changes(db, changes: Iterable[Tuple[dict, Optional[str]]]):
+    """
+    Fold attendance writes into attendance_stats with one bulk $inc.
+    Each change is (new record, previous status or None for a new row), so
+    a status transition moves `present` without touching `total`. The
+    previous status is read before the write, so two processes changing the
+    same day at once can both apply the delta; POST
+    /api/admin/attendance-stats/rebuild reconciles the counters.
+    """
+    deltas: Dict[tuple, List[int]] = {}
+    for record, previous in changes:
+        key = (record["student_id"], record["subject_code"])
+        delta = deltas.setdefault(key, [0, 0])
+        if previous is None:
+            delta[0] += 1
+        delta[1] += (record.get("status") == "present") - (previous == "present")
+    deltas = {key: d for key, d in deltas.items() if any(d)}
+    if not deltas:
+        return
+
+    semesters = await student_semesters(db, {student_id for student_id, _ in deltas})
+    ops = [
+        UpdateOne(
+            {"student_id": student_id, "subject_code": subject_code, "semester": semesters[student_id]},
+            {"$inc": {"total": total, "present": present}},
+            upsert=True,
+        )
+        for (student_id, subject_code), (total, present) in deltas.items()
+    ]
+    await db.attendance_stats.bulk_write(ops, ordered=False)
+
+
+async def _acquire_lock(db, name: str) -> bool:
+    now = datetime.utcnow()
+    lock = {"_id": name, "expires_at": now + timedelta(seconds=MAINTENANCE_LOCK_SECONDS)}
+    try:
+        await db.config.insert_one(lock)
+        return True
+    except DuplicateKeyError:
+        pass
+    # Take over an expired lock; only one contender's delete matches
+    stale = await db.config.delete_one({"_id": name, "expires_at": {"$lt": now}})
+    if not stale.deleted_count:
+        return False
+    try:
+        await db.config.insert_one(lock)
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def rebuild_attendance_stats(db, only_if_empty: bool = False) -> Optional[int]:
+    """
+    Recompute attendance_stats from the attendance collection (one-off
+    backfill, or repair after writes that bypassed this module or raced on
+    the same key). One process at a time: others skip, returning None, while
+    the lock is held. Counters are overwritten
+    in place with $set upserts rather than dropped and re-inserted, so
+    readers never see an empty collection and concurrent $inc writes only
+    race with their own key's upsert.
+    """
+    if only_if_empty and await db.attendance_stats.find_one({}, {"_id": 1}):
+        return 0
+    if not await _acquire_lock(db, STATS_REBUILD_LOCK):
+        return None
+    try:
+        # Another process may have finished the backfill before we got the lock
+        if only_if_empty and await db.attendance_stats.find_one({}, {"_id": 1}):
+            return 0
+        counts: Dict[tuple, List[int]] = {}
+        async for row in db.attendance.aggregate(_totals_pipeline({})):
+            counts[(row["_id"]["student_id"], row["_id"]["subject_code"])] = [row["total"], row["present"]]
+        async for doc in db.attendance_bitmaps.find({}):
+            total, present = attendance_bitmap.totals(doc)
+            count = counts.setdefault((doc["student_id"], doc["subject_code"]), [0, 0])
+            count[0] += total
+            count[1] += present
+
+        semesters = await student_semesters(db, {student_id for student_id, _ in counts})
+        keys = {(student_id, subject_code, semesters[student_id]) for student_id, subject_code in counts}
+        stale = [doc["_id"] async for doc in db.attendance_stats.find({}, {f: 1 for f, _ in STATS_INDEX})
+                 if tuple(doc.get(f) for f, _ in STATS_INDEX) not in keys]
+        if stale:
+            await db.attendance_stats.delete_many({"_id": {"$in": stale}})
+
+        ops = [
+            UpdateOne(
+                {"student_id": student_id, "subject_code": subject_code, "semester": semesters[student_id]},
+                {"$set": {"total": total, "present": present}},
+                upsert=True,
+            )
+            for (student_id, subject_code), (total, present) in counts.items()
+        ]
+        for offset in range(0, len(ops), BULK_CHUNK_SIZE):
+            await db.attendance_stats.bulk_write(ops[offset:offset + BULK_CHUNK_SIZE], ordered=False)
+        return len(ops)
+    finally:
+        await db.config.delete_one({"_id": STATS_REBUILD_LOCK})
+
+
+async def _dedupe_attendance(db) -> int:
+    """Delete all but the latest row (highest _id) per key; returns rows deleted"""
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": {field: f"${field}" for field in ATTENDANCE_KEY},
+                    "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    deleted, stale = 0, []
+    async for group in db.attendance.aggregate(pipeline, allowDiskUse=True):
+        stale.extend(group["ids"][:-1])
+        if len(stale) >= BULK_CHUNK_SIZE:
+            deleted += (await db.attendance.delete_many({"_id": {"$in": stale}})).deleted_count
+            stale = []
+    if stale:
+        deleted += (await db.attendance.delete_many({"_id": {"$in": stale}})).deleted_count
+    return deleted
+
+
+async def ensure_attendance_index(db):
+    """
+    Unique (student_id, subject_code, date) index. Older deployments have a
+    non-unique index with the same keys and duplicate rows from the old
+    insert_many roll call: one process removes the duplicates (keeping the
+    latest row per key), swaps the index and rebuilds the counters, once.
+    """
+    await db.attendance_stats.create_index(STATS_INDEX, unique=True)
+    await db.attendance_bitmaps.create_index(attendance_bitmap.BITMAP_INDEX, unique=True)
+    try:
+        await db.attendance.create_index(ATTENDANCE_INDEX, unique=True)
+        return
+    except OperationFailure:
+        pass
+    if not await _acquire_lock(db, INDEX_MIGRATION_LOCK):
+        # Another worker is migrating; the existing index serves meanwhile
+        return
+    try:
+        deleted = await _dedupe_attendance(db)
+        try:
+            await db.attendance.drop_index("_".join(f"{field}_1" for field in ATTENDANCE_KEY))
+        except OperationFailure:
+            pass
+        try:
+            await db.attendance.create_index(ATTENDANCE_INDEX, unique=True)
+        except OperationFailure as e:
+            await db.attendance.create_index(ATTENDANCE_INDEX)
+            print(f"Attendance index left non-unique (duplicates written during migration): {e}")
+        if deleted:
+            print(f"Removed {deleted} duplicate attendance rows")
+            # The counters were built with the duplicates included
+            await rebuild_attendance_stats(db)
+    finally:
+        await db.config.delete_one({"_id": INDEX_MIGRATION_LOCK})
+
+
+async def normalise_attendance_dates(db) -> int:
+    """
+    One-off migration of rows whose date is a BSON datetime (old seed data)
+    to the ISO date strings everything else stores, so range filters, keyset
+    cursors and sort order only ever compare strings. A row that lands on a
+    day already stored for its key is dropped in favour of the existing one.
+    Returns rows converted or dropped.
+    """
+    if await db.config.find_one({"_id": DATES_NORMALISED_FLAG}):
+        return 0
+    if not await _acquire_lock(db, DATE_MIGRATION_LOCK):
+        return 0
+    try:
+        changed, dropped = 0, []
+        while True:
+            docs = await db.attendance.find({"date": {"$type": "date"}, "_id": {"$nin": dropped}},
+                                            {"date": 1}).limit(BULK_CHUNK_SIZE).to_list(None)
+            if not docs:
+                break
+            ops = [UpdateOne({"_id": doc["_id"]}, {"$set": {"date": doc["date"].date().isoformat()}})
+                   for doc in docs]
+            collided = set()
+            try:
+                await db.attendance.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                collided = {err["index"] for err in e.details.get("writeErrors", [])}
+            stale = [doc["_id"] for n, doc in enumerate(docs) if n in collided]
+            if stale:
+                await db.attendance.delete_many({"_id": {"$in": stale}})
+                dropped.extend(stale)
+            changed += len(docs)
+        if dropped:
+            # The counters included the dropped rows
+            await rebuild_attendance_stats(db)
+        try:
+            await db.config.insert_one({"_id": DATES_NORMALISED_FLAG, "at": datetime.utcnow()})
+        except DuplicateKeyError:
+            pass
+        return changed
+    finally:
+        await db.config.delete_one({"_id": DATE_MIGRATION_LOCK})
+
+
+async def ingest_attendance(db, records: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE) -> List[dict]:
+    """
+    Upsert attendance rows keyed on (student_id, subject_code, date) with
+    unordered bulk_write calls of at most `chunk_size` operations. Replaying
+    the same roll call is a no-op. Returns one outcome per input row:
+    inserted, updated, duplicate (a later row in the batch has the same key)
+    or error.
+    """
+    records = list(records)
+    outcomes = [{"row": i, "status": None} for i in range(len(records))]
+
+    # Last row wins for repeated keys within one submission
+    latest = {}
+    for i, record in enumerate(records):
+        key = tuple(record[field] for field in ATTENDANCE_KEY)
+        if key in latest:
+            outcomes[latest[key]]["status"] = "duplicate"
+        latest[key] = i
+    rows = sorted(latest.values())
+
+    if bitmap_mode():
+        packable = [i for i in rows if _packable(records[i])]
+        rows = [i for i in rows if not _packable(records[i])]
+        for offset in range(0, len(packable), chunk_size):
+            chunk = packable[offset:offset + chunk_size]
+            # Days already stored as documents (from before bitmap mode) stay
+            # documents, so a day is never counted in both places
+            stored = await _existing_statuses(db, [records[i] for i in chunk])
+            rows.extend(i for i in chunk if tuple(records[i][field] for field in ATTENDANCE_KEY) in stored)
+            chunk = [i for i in chunk if tuple(records[i][field] for field in ATTENDANCE_KEY) not in stored]
+            if not chunk:
+                continue
+            results = await attendance_bitmap.write_records(db, [records[i] for i in chunk])
+            changes = []
+            for i, (outcome, previous) in zip(chunk, results):
+                outcomes[i]["status"] = outcome
+                if outcome == "error":
+                    outcomes[i]["detail"] = "concurrent updates kept conflicting"
+                else:
+                    changes.append((records[i], previous))
+            await apply_stat_changes(db, changes)
+        rows.sort()
+
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        ops = [
+            UpdateOne({field: records[i][field] for field in ATTENDANCE_KEY},
+                      {"$set": records[i]}, upsert=True)
+            for i in chunk
+        ]
+        previous = await _existing_statuses(db, [records[i] for i in chunk])
+        failed = {}
+        try:
+            result = await db.attendance.bulk_write(ops, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            details = e.details
+            upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+            failed = {err["index"]: err.get("errmsg", "write failed") for err in details.get("writeErrors", [])}
+
+        changes = []
+        for op_index, i in enumerate(chunk):
+            if op_index in failed:
+                outcomes[i].update(status="error", detail=failed[op_index])
+            elif op_index in upserted:
+                outcomes[i]["status"] = "inserted"
+                changes.append((records[i], None))
+            else:
+                outcomes[i]["status"] = "updated"
+                key = tuple(records[i][field] for field in ATTENDANCE_KEY)
+                if key in previous:
+                    changes.append((records[i], previous[key]))
+        await apply_stat_changes(db, changes)
+    return outcomes
+
+
+async def _existing_statuses(db, records: List[dict]) -> Dict[tuple, Optional[str]]:
+    """Current status of the rows a chunk is about to overwrite, in one query"""
+    query = {field: {"$in": list({r[field] for r in records})} for field in ATTENDANCE_KEY}
+    wanted = {tuple(r[field] for field in ATTENDANCE_KEY) for r in records}
+    existing = {}
+    async for doc in db.attendance.find(query, {"_id": 0, **{field: 1 for field in ATTENDANCE_KEY}, "status": 1}):
+        key = tuple(doc[field] for field in ATTENDANCE_KEY)
+        if key in wanted:
+            existing[key] = doc.get("status")
+    return existing
+
+
+def summarize_outcomes(outcomes: List[dict]) -> Dict[str, int]:
+    counts = {"inserted": 0, "updated": 0, "duplicate": 0, "error": 0}
+    for outcome in outcomes:
+        counts[outcome["status"]] += 1
+    return counts
+
+
+async def find_attendance(db, student_id: Optional[str] = None, subject_code: Optional[str] = None,
+                          day: Optional[str] = None) -> List[dict]:
+    """Attendance rows from both storage modes, in the per-day document shape"""
+    query = {}
+    if student_id is not None:
+        query["student_id"] = student_id
+    if subject_code is not None:
+        query["subject_code"] = subject_code
+    if day is not None:
+        query["date"] = day
+    records = []
+    async for doc in db.attendance.find(query):
+        doc["id"] = str(doc.pop("_id"))
+        records.append(doc)
+    records.extend(await attendance_bitmap.find_records(db, student_id, subject_code, day))
+    return records
+
+
+def encode_cursor(record: dict) -> str:
+    day, record_id = _history_key(record)
+    return base64.urlsafe_b64encode(f"{day}|{record_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(date, id) of the last record of the previous page; ValueError if malformed"""
+    try:
+        day, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        ObjectId(record_id[:24])
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+    return day, record_id
+
+
+def _history_key(record: dict) -> Tuple[str, str]:
+    """(date, id) as strings, whatever type the date was read as"""
+    day = record["date"]
+    return (day.isoformat() if hasattr(day, "isoformat") else str(day)), record["id"]
+
+
+async def iter_history(db, student_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                       subjects: Optional[Sequence[str]] = None, fields: Optional[Sequence[str]] = None,
+                       after: Optional[Tuple[str, str]] = None,
+                       limit: Optional[int] = None) -> AsyncIterator[dict]:
+    """
+    A student's attendance ordered by (date, id), read lazily from a Motor
+    cursor. `after` is the keyset position to resume from. Packed bitmap
+    rows (bounded by one document per subject and semester) are merged in.
+    """
+    query = {"student_id": student_id}
+    if start or end:
+        query["date"] = {**({"$gte": start} if start else {}), **({"$lte": end} if end else {})}
+    if subjects:
+        query["subject_code"] = {"$in": list(subjects)}
+    if after is not None:
+        day, record_id = after
+        # ObjectId order matches the hex order used for packed row ids
+        query["$or"] = [{"date": {"$gt": day}},
+                        {"date": day, "_id": {"$gt": ObjectId(record_id[:24])}}]
+    wanted = [f for f in (fields or HISTORY_FIELDS) if f in HISTORY_FIELDS and f != "date"]
+    projection = {field: 1 for field in (*wanted, "date")}
+
+    packed = [
+        r for r in await attendance_bitmap.find_records(db, student_id)
+        if (not start or r["date"] >= start) and (not end or r["date"] <= end)
+        and (not subjects or r["subject_code"] in subjects)
+        and (after is None or (r["date"], r["id"]) > after)
+    ]
+    packed.sort(key=lambda r: (r["date"], r["id"]))
+
+    def shape(record: dict) -> dict:
+        return {"id": record["id"], "date": record["date"], **{field: record.get(field) for field in wanted}}
+
+    cursor = db.attendance.find(query, projection).sort([("date", 1), ("_id", 1)]).batch_size(HISTORY_BATCH_SIZE)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    sent = 0
+    async for doc in cursor:
+        doc["id"] = str(doc.pop("_id"))
+        while packed and _history_key(packed[0]) < _history_key(doc):
+            if limit is not None and sent >= limit:
+                return
+            yield shape(packed.pop(0))
+            sent += 1
+        if limit is not None and sent >= limit:
+            return
+        yield shape(doc)
+        sent += 1
+    for record in packed:
+        if limit is not None and sent >= limit:
+            return
+        yield shape(record)
+        sent += 1
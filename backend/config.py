@@ -4,6 +4,7 @@ Supports environment-based configuration for multiple deployment scenarios
 """
 
 import os
+import tempfile
 from typing import Optional
 from dotenv import load_dotenv
 from pydantic import Field, validator
@@ -101,6 +102,34 @@ class Environment(BaseSettings):
         default=True,
         description="Enable data segregation per department"
     )
+    DEFAULT_COUNTRY_CODE: str = Field(
+        default="IN",
+        description="Country used for public holidays when a campus has no override"
+    )
+    CAMPUS_COUNTRY_CODES: dict = Field(
+        default={"CAMPUS_001": "IN"},
+        description="Public holiday country per campus (warmed up at startup)"
+    )
+    ATTENDANCE_STORAGE_MODE: str = Field(
+        default="documents",
+        description="Attendance storage: documents (one per day) or bitmap (packed per semester)"
+    )
+    ATTENDANCE_WRITE_BEHIND_MS: int = Field(
+        default=250,
+        description="Coalescing window for single attendance writes (0 writes through)"
+    )
+    MARK_UPLOAD_CONCURRENCY: int = Field(
+        default=2,
+        description="Marks CSV uploads processed at once per worker"
+    )
+    MARK_UPLOAD_STALE_MINUTES: int = Field(
+        default=30,
+        description="Queued/running uploads with no progress for this long are marked interrupted at startup"
+    )
+    CALENDAR_TABLE_DIR: str = Field(
+        default=os.path.join(tempfile.gettempdir(), "edupath_calendar_tables"),
+        description="Directory of memory-mapped calendar tables shared by workers (empty disables)"
+    )
 
     # ─────────────────────────────────────────────────────────────
     # FEATURE FLAGS
@@ -1,5 +1,6 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure
+from attendance_store import ensure_attendance_index, normalise_attendance_dates, rebuild_attendance_stats
 import os
 from dotenv import load_dotenv
 
@@ -18,11 +19,19 @@ async def connect_db():
     db = client[DB_NAME]
     # Create indexes - Phase 1
     await db.students.create_index("student_id", unique=True)
-    await db.attendance.create_index([("student_id", 1), ("subject_code", 1), ("date", 1)])
+    await ensure_attendance_index(db)
+    # One-off date migration and backfill of the pre-aggregated counters
+    # (one worker does each)
+    try:
+        await normalise_attendance_dates(db)
+        await rebuild_attendance_stats(db, only_if_empty=True)
+    except (BulkWriteError, OperationFailure) as e:
+        print(f"Attendance migration failed, history or counters may be incomplete: {e}")
     await db.subjects.create_index("subject_code", unique=True)
     # Create indexes - Phase 2 & 3
     await db.academic_performance.create_index([("student_id", 1), ("subject_code", 1)])
     await db.curriculum_map.create_index([("prerequisite_code", 1), ("current_code", 1)])
+    await db.mark_uploads.create_index([("subject_code", 1), ("upload_date", -1)])
     print(f"Connected to MongoDB: {DB_NAME}")
 
 async def disconnect_db():
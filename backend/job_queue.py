@@ -0,0 +1,72 @@
+"""
+Bounded-concurrency background job queue for long-running uploads.
+Jobs are coroutine factories run by a fixed number of worker tasks on the
+server's event loop; job state itself lives in MongoDB so any worker
+process can answer progress polls.
+"""
+
+import asyncio
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+Job = Callable[[], Awaitable[None]]
+
+
+class JobQueue:
+    """FIFO of background jobs, at most `concurrency` running at once"""
+
+    def __init__(self, concurrency: int = 2, name: str = "jobs"):
+        self.concurrency = max(1, concurrency)
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop = None
+        self._owner = None
+        self._owner_pid = None
+
+    @property
+    def owner(self) -> str:
+        """Token naming this process's queue, stamped on the jobs it runs"""
+        # Recomputed after a fork so pre-forked workers do not share it
+        if self._owner_pid != os.getpid():
+            self._owner_pid = os.getpid()
+            self._owner = f"{socket.gethostname()}:{self._owner_pid}:{uuid.uuid4().hex[:8]}"
+        return self._owner
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await job()
+            except Exception as e:
+                # Jobs record their own failures; this only keeps the worker alive
+                print(f"Background job in {self.name} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, job: Job) -> int:
+        """Queue a job; returns how many jobs are now waiting"""
+        self._ensure_workers()
+        self._queue.put_nowait(job)
+        return self._queue.qsize()
+
+    async def join(self):
+        """Wait until every queued job has finished"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
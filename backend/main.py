@@ -4,8 +4,15 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pathlib import Path
 import os
+from datetime import date
 from routers import students, teachers, admin, attendance, optimization, phase_2_3, auth
-from database import connect_db, disconnect_db
+from database import connect_db, disconnect_db, get_db
+from config import settings
+from attendance_buffer import attendance_buffer
+from scheduling import holiday_registry
+from scheduling.event_index import event_index
+from scheduling.semester_calendar import configure_table_store
+from semester import semester_calendar_for
 
 # Absolute Path Resolution
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,9 +35,25 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup():
     await connect_db()
+    # Uploads whose worker died mid-job would otherwise stay queued forever
+    await teachers.sweep_stale_upload_jobs(get_db())
+    # Build holiday rule sets once per worker before the first request
+    countries = {settings.DEFAULT_COUNTRY_CODE, *settings.CAMPUS_COUNTRY_CODES.values()}
+    this_year = date.today().year
+    holiday_registry.warm_up(countries, [this_year, this_year + 1])
+    # Publish (or map) the shared calendar tables for every campus; workers
+    # after the first just map the files written for this events version
+    configure_table_store(settings.CALENDAR_TABLE_DIR or None)
+    events_version, fest_dates = await event_index.snapshot(get_db())
+    for campus_id in {settings.DEFAULT_CAMPUS_ID, *settings.CAMPUS_COUNTRY_CODES}:
+        semester_calendar_for({"campus_id": campus_id}, events_version, fest_dates)
 
 @app.on_event("shutdown")
 async def shutdown():
+    # Write any coalesced attendance clicks before the connection goes away
+    await attendance_buffer.close()
+    await teachers.upload_queue.close()
+    await teachers.interrupt_upload_jobs(get_db())
     await disconnect_db()
 
 # API Routers
@@ -0,0 +1,123 @@
+"""
+Marks upload helpers for the teacher router: set-based lookups of the
+students and subjects an upload references, chunked unordered bulk
+upserts into academic_performance, and file fingerprints for spotting
+repeated uploads
+"""
+
+import hashlib
+from typing import Dict, Iterable, List, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+# One performance record per student and subject
+PERFORMANCE_KEY = ("student_id", "subject_code")
+
+# Operations per bulk_write round trip
+MARKS_CHUNK_SIZE = 1000
+
+# A row whose stored values all match is left untouched
+DIFF_FIELDS = ("subject_name", "mid_term_marks", "cie_marks", "semester")
+
+# Bytes read per step while fingerprinting an upload
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+async def read_with_hash(upload) -> Tuple[bytes, str]:
+    """Read an UploadFile in chunks, returning its content and SHA-256 hex digest"""
+    digest = hashlib.sha256()
+    parts = []
+    while True:
+        chunk = await upload.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        parts.append(chunk)
+    return b"".join(parts), digest.hexdigest()
+
+
+async def students_by_id(db, student_ids: Iterable[str]) -> Dict[str, dict]:
+    """Every referenced student in one $in query"""
+    ids = list(set(student_ids))
+    if not ids:
+        return {}
+    students = {}
+    async for student in db.students.find({"student_id": {"$in": ids}}):
+        students[student["student_id"]] = student
+    return students
+
+
+async def subjects_by_code(db, subject_codes: Iterable[str]) -> Dict[str, dict]:
+    """Every referenced subject in one $in query"""
+    codes = list(set(subject_codes))
+    if not codes:
+        return {}
+    subjects = {}
+    async for subject in db.subjects.find({"subject_code": {"$in": codes}}):
+        subjects[subject["subject_code"]] = subject
+    return subjects
+
+
+async def _stored_values(db, docs: List[dict]) -> Dict[tuple, tuple]:
+    """DIFF_FIELDS of the records these docs would overwrite, in one query"""
+    query = {field: {"$in": list({doc[field] for doc in docs})} for field in PERFORMANCE_KEY}
+    projection = {"_id": 0, **{field: 1 for field in (*PERFORMANCE_KEY, *DIFF_FIELDS)}}
+    stored = {}
+    async for doc in db.academic_performance.find(query, projection):
+        stored[tuple(doc[field] for field in PERFORMANCE_KEY)] = tuple(doc.get(field) for field in DIFF_FIELDS)
+    return stored
+
+
+async def upsert_marks(db, docs: List[dict], chunk_size: int = MARKS_CHUNK_SIZE,
+                       skip_unchanged: bool = False) -> List[dict]:
+    """
+    Upsert performance records keyed on (student_id, subject_code) with one
+    unordered bulk_write per chunk. Returns one outcome per doc: inserted,
+    updated, unchanged (skip_unchanged and the stored values already match),
+    duplicate (a later doc has the same key) or error.
+    """
+    outcomes = [{"status": None} for _ in docs]
+
+    # Last doc wins for repeated keys, as sequential updates would have done
+    latest = {}
+    for i, doc in enumerate(docs):
+        key = tuple(doc[field] for field in PERFORMANCE_KEY)
+        if key in latest:
+            outcomes[latest[key]]["status"] = "duplicate"
+        latest[key] = i
+    rows = sorted(latest.values())
+
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        if skip_unchanged:
+            # Row-wise diff against what is stored: only modified rows are written
+            stored = await _stored_values(db, [docs[i] for i in chunk])
+            changed = []
+            for i in chunk:
+                key = tuple(docs[i][field] for field in PERFORMANCE_KEY)
+                if stored.get(key) == tuple(docs[i].get(field) for field in DIFF_FIELDS):
+                    outcomes[i]["status"] = "unchanged"
+                else:
+                    changed.append(i)
+            chunk = changed
+            if not chunk:
+                continue
+        ops = [
+            UpdateOne({field: docs[i][field] for field in PERFORMANCE_KEY}, {"$set": docs[i]}, upsert=True)
+            for i in chunk
+        ]
+        failed = {}
+        try:
+            result = await db.academic_performance.bulk_write(ops, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            details = e.details
+            upserted = {u["index"]: u["_id"] for u in details.get("upserted", [])}
+            failed = {err["index"]: err.get("errmsg", "write failed") for err in details.get("writeErrors", [])}
+
+        for op_index, i in enumerate(chunk):
+            if op_index in failed:
+                outcomes[i].update(status="error", detail=failed[op_index])
+            else:
+                outcomes[i]["status"] = "inserted" if op_index in upserted else "updated"
+    return outcomes
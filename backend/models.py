@@ -83,6 +83,10 @@ class AttendanceRecord(BaseModel):
     status: AttendanceStatus = AttendanceStatus.PRESENT
 
 
+class AttendanceBatch(BaseModel):
+    records: List[AttendanceRecord] = Field(..., max_length=50000)
+
+
 class AttendanceBulkUpdate(BaseModel):
     subject_code: str
     date: date
@@ -104,6 +108,19 @@ class OptimizationRequest(BaseModel):
     upcoming_leave_dates: Optional[List[date]] = []
 
 
+class LeaveSimulationRequest(OptimizationRequest):
+    """Candidate leave plans; falls back to upcoming_leave_dates as a single plan"""
+    leave_plans: List[List[date]] = Field(default=[], max_length=500)
+
+
+class BatchStrategyRequest(BaseModel):
+    """Either an explicit list of usernames or a cohort filter"""
+    usernames: Optional[List[str]] = None
+    campus_id: Optional[str] = None
+    department_id: Optional[str] = None
+    semester: Optional[int] = None
+
+
 class DateClassification(BaseModel):
     date: date
     day_name: str
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from models import UniversityEvent, Role
 from database import get_db
+from attendance_store import rebuild_attendance_stats
+from scheduling.event_index import event_index
 from typing import List
 
 router = APIRouter()
@@ -35,6 +37,7 @@ async def create_event(event: UniversityEvent, _=Depends(verify_admin)):
     data = event.model_dump()
     data["event_date"] = data["event_date"].isoformat()
     result = await db.events.insert_one(data)
+    await event_index.add(db, data["event_date"])
     return {"id": str(result.inserted_id), "message": "Event added successfully"}
 
 
@@ -44,6 +47,15 @@ async def add_fest_legacy(event: UniversityEvent, _=Depends(verify_admin)):
     return await create_event(event)
 
 
+@router.post("/attendance-stats/rebuild")
+async def rebuild_attendance_counters(_=Depends(verify_admin)):
+    """Recompute the attendance counters from the stored rows (repairs drift)"""
+    rebuilt = await rebuild_attendance_stats(get_db())
+    if rebuilt is None:
+        raise HTTPException(status_code=409, detail="A rebuild is already running")
+    return {"message": "Attendance counters rebuilt", "counters": rebuilt}
+
+
 @router.get("/events/")
 async def list_events():
     db = get_db()
@@ -75,11 +87,13 @@ async def delete_event(event_id: str):
     from bson import ObjectId
     db = get_db()
     try:
-        result = await db.events.delete_one({"_id": ObjectId(event_id)})
+        deleted = await db.events.find_one_and_delete({"_id": ObjectId(event_id)})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid event ID")
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Event not found")
+    if deleted.get("event_date"):
+        await event_index.remove(db, deleted["event_date"])
     return {"message": "Event deleted successfully"}
 
 
@@ -1,58 +1,263 @@
-from fastapi import APIRouter, HTTPException
-from models import AttendanceRecord
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from models import AttendanceRecord, AttendanceBatch, AttendanceStatus
 from database import get_db
+from attendance_store import (
+    decode_cursor, encode_cursor, ingest_attendance, iter_history, subject_totals, summarize_outcomes,
+)
+from attendance_buffer import attendance_buffer
+from semester import find_student, section_schedule
+from datetime import date
+from itertools import islice
+from typing import List, Optional
+import csv
+import codecs
+import json
 
 router = APIRouter()
 
+# CSV rows parsed, validated and upserted per round
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
 
-def _serialize(doc):
-    if doc and "_id" in doc:
-        doc["id"] = str(doc.pop("_id"))
-    return doc
+STATUS_VALUES = {status.value for status in AttendanceStatus}
 
 
 @router.post("/", status_code=201)
-async def record_attendance(record: AttendanceRecord):
+async def record_attendance(record: AttendanceRecord, sync: bool = False):
+    """
+    Record one click. Writes are coalesced per student/subject/date and
+    flushed in bulk shortly after; pass sync=true to have the row (and
+    anything queued before it) written before the response.
+    """
     db = get_db()
     data = record.model_dump()
     data["date"] = data["date"].isoformat()
-    # Upsert: one record per student/subject/date
-    await db.attendance.update_one(
-        {
-            "student_id": data["student_id"],
-            "subject_code": data["subject_code"],
-            "date": data["date"],
-        },
-        {"$set": data},
-        upsert=True,
-    )
-    return {"message": "Attendance recorded"}
+    data["status"] = record.status.value
+    # Upsert: one record per student/subject/date, counters updated with it
+    await attendance_buffer.write(db, data, sync=sync)
+    return {"message": "Attendance recorded", "queued": not sync and attendance_buffer.window_seconds > 0}
+
+
+@router.post("/bulk")
+async def record_attendance_bulk(batch: AttendanceBatch):
+    """Idempotent bulk upsert with a per-row outcome for every submitted record"""
+    db = get_db()
+    records = []
+    for record in batch.records:
+        data = record.model_dump()
+        data["date"] = data["date"].isoformat()
+        data["status"] = record.status.value
+        records.append(data)
+    outcomes = await ingest_attendance(db, records)
+    return {"summary": summarize_outcomes(outcomes), "results": outcomes}
+
+
+def _history_stream(records) -> StreamingResponse:
+    """Write a JSON array incrementally as records come off the cursor"""
+    async def generate():
+        yield "["
+        first = True
+        async for record in records:
+            yield ("" if first else ",") + json.dumps(jsonable_encoder(record), ensure_ascii=False)
+            first = False
+        yield "]"
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+def _fields(fields: Optional[str]) -> Optional[List[str]]:
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+def _parse_import_row(row: dict, subject_code: Optional[str], day: Optional[date]) -> dict:
+    """Validated attendance record from one CSV row; ValueError describes the problem"""
+    student_id = (row.get("student_id") or "").strip()
+    code = (row.get("subject_code") or subject_code or "").strip()
+    raw_date = (row.get("date") or "").strip()
+    status = (row.get("status") or "present").strip().lower()
+    if not student_id or not code:
+        raise ValueError("Missing student_id or subject_code")
+    if status not in STATUS_VALUES:
+        raise ValueError(f"Unknown status '{status}'")
+    try:
+        record_date = date.fromisoformat(raw_date) if raw_date else day
+    except ValueError:
+        raise ValueError(f"Invalid date '{raw_date}' (expected YYYY-MM-DD)")
+    if record_date is None:
+        raise ValueError("Missing date")
+    return {"student_id": student_id, "subject_code": code, "date": record_date.isoformat(), "status": status}
+
+
+@router.post("/import/csv")
+async def import_attendance_csv(file: UploadFile = File(...), subject_code: Optional[str] = None,
+                                day: Optional[date] = Query(default=None, alias="date")):
+    """
+    Import roll calls from a CSV file of any size.
+
+    Expected CSV format (subject_code/date columns may be omitted when given
+    as query parameters; status defaults to present):
+    student_id,subject_code,date,status
+    2024001,CS101,2026-03-02,present
+    2024002,CS101,2026-03-02,absent
+
+    The upload is decoded incrementally from its spooled file and handled in
+    batches of IMPORT_BATCH_SIZE rows, each flushed through idempotent bulk
+    upserts, so memory stays flat and re-importing a file changes nothing.
+    """
+    db = get_db()
+    reader = csv.DictReader(codecs.getreader("utf-8-sig")(file.file))
+    try:
+        fieldnames = await run_in_threadpool(lambda: reader.fieldnames)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Error reading file: {e}")
+    if not fieldnames:
+        raise HTTPException(status_code=400, detail="Empty CSV file")
+    if "student_id" not in fieldnames:
+        raise HTTPException(status_code=400, detail="CSV must have a student_id column")
+
+    total_rows = 0
+    summary = {"inserted": 0, "updated": 0, "duplicate": 0, "error": 0}
+    errors = []
+    while True:
+        try:
+            # Parsing touches the (possibly disk-backed) file: keep it off the event loop
+            batch = await run_in_threadpool(lambda: list(islice(reader, IMPORT_BATCH_SIZE)))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Error reading file after row {total_rows + 1}: {e}")
+        if not batch:
+            break
+
+        records, row_numbers = [], []
+        for row_idx, row in enumerate(batch, start=total_rows + 2):  # row 1 is the header
+            try:
+                records.append(_parse_import_row(row, subject_code, day))
+                row_numbers.append(row_idx)
+            except ValueError as e:
+                summary["error"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f"Row {row_idx}: {e}")
+        total_rows += len(batch)
+
+        for outcome in await ingest_attendance(db, records):
+            summary[outcome["status"]] += 1
+            if outcome["status"] == "error" and len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(f"Row {row_numbers[outcome['row']]}: {outcome['detail']}")
+
+    return {
+        "message": "Attendance imported",
+        "file": file.filename,
+        "total_rows": total_rows,
+        "summary": summary,
+        "errors": errors,
+    }
 
 
 @router.get("/{student_id}")
 async def get_student_attendance(student_id: str):
     db = get_db()
-    records = []
-    async for r in db.attendance.find({"student_id": student_id}):
-        records.append(_serialize(r))
-    return records
+    return _history_stream(iter_history(db, student_id))
 
 
-@router.get("/{student_id}/{subject_code}/summary")
-async def get_subject_summary(student_id: str, subject_code: str):
+@router.get("/{student_id}/history")
+async def get_attendance_history(student_id: str,
+                                 from_date: Optional[date] = Query(default=None, alias="from"),
+                                 to_date: Optional[date] = Query(default=None, alias="to"),
+                                 subject: Optional[List[str]] = Query(default=None),
+                                 fields: Optional[str] = Query(default=None, description="Comma-separated: subject_code,date,status,student_id"),
+                                 limit: int = Query(default=100, ge=1, le=1000),
+                                 cursor: Optional[str] = None):
+    """One page of history ordered by (date, id); pass next_cursor to continue"""
+    db = get_db()
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    records = [
+        record async for record in iter_history(
+            db, student_id,
+            start=from_date.isoformat() if from_date else None,
+            end=to_date.isoformat() if to_date else None,
+            subjects=subject, fields=_fields(fields), after=after, limit=limit + 1,
+        )
+    ]
+    next_cursor = encode_cursor(records[limit - 1]) if len(records) > limit else None
+    return {"records": records[:limit], "next_cursor": next_cursor}
+
+
+@router.get("/{student_id}/history/stream")
+async def stream_attendance_history(student_id: str,
+                                    from_date: Optional[date] = Query(default=None, alias="from"),
+                                    to_date: Optional[date] = Query(default=None, alias="to"),
+                                    subject: Optional[List[str]] = Query(default=None),
+                                    fields: Optional[str] = None):
+    """The whole filtered history as a JSON array streamed from the cursor"""
     db = get_db()
-    total = await db.attendance.count_documents(
-        {"student_id": student_id, "subject_code": subject_code}
-    )
-    present = await db.attendance.count_documents(
-        {"student_id": student_id, "subject_code": subject_code, "status": "present"}
-    )
+    return _history_stream(iter_history(
+        db, student_id,
+        start=from_date.isoformat() if from_date else None,
+        end=to_date.isoformat() if to_date else None,
+        subjects=subject, fields=_fields(fields),
+    ))
+
+
+def _subject_summary(subject_code: str, total: int, present: int, schedule, today: date) -> dict:
     percentage = round((present / total * 100), 2) if total > 0 else 0
+
+    # Sessions still scheduled for this subject from the section timetable
+    scheduled = schedule.total(subject_code) if schedule else 0
+    remaining = schedule.remaining_from(subject_code, today) if schedule else 0
+    best_case = round(((present + remaining) / (total + remaining) * 100), 2) if total + remaining > 0 else 0
     return {
-        "student_id": student_id,
         "subject_code": subject_code,
         "total_classes": total,
         "classes_attended": present,
         "attendance_percentage": percentage,
         "is_safe": percentage >= 75,
+        "scheduled_sessions": scheduled,
+        "sessions_remaining": remaining,
+        "max_achievable_percentage": best_case,
+    }
+
+
+async def _student_schedule(db, student_id: str):
+    student = await find_student(db, student_id)
+    return await section_schedule(db, student) if student else None
+
+
+@router.get("/{student_id}/summary")
+async def get_attendance_summary(student_id: str):
+    """Every subject's totals from one aggregation, whatever the subject count"""
+    db = get_db()
+    totals = await subject_totals(db, student_id)
+    schedule = await _student_schedule(db, student_id)
+    today = date.today()
+
+    codes = sorted(set(totals) | set(schedule.subjects if schedule else ()))
+    subjects = [
+        _subject_summary(code, *totals.get(code, (0, 0)), schedule, today)
+        for code in codes
+    ]
+    total = sum(t for t, _ in totals.values())
+    present = sum(p for _, p in totals.values())
+    percentage = round((present / total * 100), 2) if total > 0 else 0
+    return {
+        "student_id": student_id,
+        "total_classes": total,
+        "classes_attended": present,
+        "attendance_percentage": percentage,
+        "is_safe": percentage >= 75,
+        "subjects": subjects,
     }
+
+
+@router.get("/{student_id}/{subject_code}/summary")
+async def get_subject_summary(student_id: str, subject_code: str):
+    db = get_db()
+    totals = await subject_totals(db, student_id, subject_code)
+    total, present = totals.get(subject_code, (0, 0))
+    schedule = await _student_schedule(db, student_id)
+    return {"student_id": student_id, **_subject_summary(subject_code, total, present, schedule, date.today())}
@@ -1,115 +1,349 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from models import OptimizationRequest, OptimizationResponse, DateClassification, CareerTrack
+from models import OptimizationRequest, OptimizationResponse, DateClassification, CareerTrack, BatchStrategyRequest, LeaveSimulationRequest
 from database import get_db
+from semester import SEMESTER_START, SEMESTER_END, country_for, section_key, semester_calendar_for, section_schedule, find_student
+from attendance_store import subject_totals
+from scheduling.event_index import event_index
+from scheduling.career_matcher import CAREER_SUBJECT_MAP, career_matcher
+from scheduling.roadmap import DatePlan, ScoredDay, cached_plan, store_plan, format_day
+from scheduling import solver
+from scheduling.leave_windows import Window, cheapest_window, longest_skippable
 from datetime import date, datetime, timedelta
+from typing import Optional
+import json
 import math
-import holidays
+import numpy as np
 
 router = APIRouter()
 
-# Career track → high-priority subject keywords
-CAREER_SUBJECT_MAP = {
-    "AI & ML": ["python", "ml", "machine learning", "neural", "data science"],
-    "Cyber Security": ["security", "network", "cryptography", "ethical", "cyber"],
-    "Web Dev": ["web", "html", "css", "javascript", "react", "node", "database"],
-    "IOT": ["embedded", "sensors", "arduino", "raspberry", "electronics"],
-    "General": []
-}
-
-def get_working_days(start: date, end: date, public_holidays, fests):
-    """Filter out weekends, holidays, and fests from a date range"""
-    working_days = []
-    current = start
-    if current < date.today():
-        current = date.today()
-        
-    while current <= end:
-        # 1. Skip Weekends (5=Sat, 6=Sun)
-        if current.weekday() < 5:
-            # 2. Skip Public Holidays
-            if current not in public_holidays:
-                # 3. Skip University Fests
-                if current.strftime("%Y-%m-%d") not in fests:
-                    working_days.append(current)
-        current += timedelta(days=1)
-    return working_days
+GOAL_PCT = 75
 
-@router.get("/strategy/{username}")
-async def get_strategic_roadmap(username: str):
-    db = get_db()
-    user = await db.users.find_one({"username": username})
-    if not user:
-        raise HTTPException(status_code=404, detail="Student not found")
+# Career days used when no timetable has been uploaded yet
+CAREER_WEEKDAYS = (1, 3)  # Tue/Thu
+
+
+async def date_plan_for(db, user: dict, events_version: int, fest_dates, today: date) -> DatePlan:
+    """Shared (section, track, semester) date plan for this student"""
+    country = country_for(user)
+    track = user.get("career_track", "General")
+    # The subjects version keeps plans scored before a new subject from being served
+    subjects_version = await career_matcher.ensure_loaded(db)
+    key = (section_key(user), track, country, SEMESTER_START, SEMESTER_END, events_version, subjects_version)
+    plan = cached_plan(key, today)
+    if plan is not None:
+        return plan
+
+    calendar = semester_calendar_for(user, events_version, fest_dates)
+    schedule = await section_schedule(db, user, events_version, fest_dates)
+    career_weekdays = CAREER_WEEKDAYS if CAREER_SUBJECT_MAP.get(track) else ()
+    plan = DatePlan(calendar, today, schedule.timetable,
+                    lambda subject: career_matcher.is_career_subject(subject, track), career_weekdays)
+    return store_plan(key, today, plan)
+
+
+def classify(scored: ScoredDay, classification: str, reason: str) -> dict:
+    return DateClassification(
+        date=scored.day,
+        day_name=scored.day.strftime("%A"),
+        subjects=list(scored.subjects),
+        classification=classification,
+        impact_score=scored.impact_score,
+        reason=reason,
+    ).model_dump(mode="json")
+
+
+def required_days(plan: DatePlan) -> int:
+    return math.ceil(GOAL_PCT / 100 * plan.total_working)
+
+
+def build_roadmap(user: dict, plan: DatePlan, gap: int = None) -> dict:
+    """Per-student part of the roadmap: gap arithmetic and slicing of the shared plan"""
+    total_working = plan.total_working
+    remaining_count = plan.remaining_count
 
-    # 1. Setup Date Context
-    # In production, these come from a 'semester_config' collection
-    sem_start = date(2026, 1, 1)
-    sem_end = date(2026, 5, 30)
-    today = date.today()
-    
-    # 2. Fetch External Blockers
-    in_holidays = holidays.India(years=[2026])
-    fest_docs = await db.events.find().to_list(None)
-    fest_dates = [f["event_date"][:10] for f in fest_docs] # YYYY-MM-DD
-
-    # 3. Calculate Math
-    all_sem_working = get_working_days(sem_start, sem_end, in_holidays, fest_dates)
-    remaining_working = get_working_days(today, sem_end, in_holidays, fest_dates)
-    
-    total_needed_count = math.ceil(0.75 * len(all_sem_working))
     current_attended = user.get("attended", 0)
-    gap = max(0, total_needed_count - current_attended)
-    
-    # 4. Smart Logic Reasoning
-    status_type = "SAFE"
-    reasoning = ""
+    if gap is None:
+        gap = max(0, required_days(plan) - current_attended)
+    track = user.get("career_track", "General")
+
+    # Smart Logic Reasoning
     if gap == 0:
         status_type = "SAFE"
-        reasoning = f"Goal met! You are at {round((current_attended/len(all_sem_working))*100, 1)}%. You can safely skip mandatory classes, but check your Career Dates below."
-    elif gap > len(remaining_working):
+        reasoning = f"Goal met! You are at {round((current_attended/total_working)*100, 1)}%. You can safely skip mandatory classes, but check your Career Dates below."
+    elif gap > remaining_count:
         status_type = "CRITICAL"
-        reasoning = f"⚠️ CRITICAL RISK: It is impossible to hit 75%. You need {gap} classes but only {len(remaining_working)} remain. Please meet your counselor immediately."
+        reasoning = f"⚠️ CRITICAL RISK: It is impossible to hit 75%. You need {gap} classes but only {remaining_count} remain. Please meet your counselor immediately."
     else:
         status_type = "ON_TRACK"
-        reasoning = f"You need {gap} more classes. We have picked the best days for your {user.get('career_track', 'General')} track."
+        reasoning = f"You need {gap} more classes. We have picked the best days for your {track} track."
 
-    # 5. Career-First Picker
-    # Mocking subject-to-date mapping (In production, this joins with the timetable)
-    p_dates = [] # Career Priority
-    g_dates = [] # Buffer
-    
-    track = user.get("career_track", "General")
-    keywords = CAREER_SUBJECT_MAP.get(track, [])
-    
-    # Simple logic: Every Tue/Thu is a "Career" day for this demo
-    for d in remaining_working:
-        if len(p_dates) + len(g_dates) >= gap + 5: break # Show gap + 5 buffer days
-        
-        if d.weekday() in [1, 3] and keywords: # Tue/Thu
-            p_dates.append(d.strftime("%d-%m-%Y"))
-        else:
-            g_dates.append(d.strftime("%d-%m-%Y"))
-
-    # Prioritize Career dates first to fill the gap
-    final_p = p_dates[:gap] if len(p_dates) >= gap else p_dates
-    final_g = g_dates[:(gap - len(final_p))] if gap > len(final_p) else g_dates[:5]
+    # Impact-scored picker: best `gap` days, career sessions first in weight
+    career, buffer, skip_safe = plan.select(gap)
 
     return {
         "student_name": user.get("name"),
         "track": track,
         "stats": {
-            "current_pct": round((current_attended/len(all_sem_working))*100, 1),
-            "goal_pct": 75,
+            "current_pct": round((current_attended/total_working)*100, 1),
+            "goal_pct": GOAL_PCT,
             "gap_number": gap,
-            "days_remaining": len(remaining_working)
+            "days_remaining": remaining_count
         },
         "message": {
             "type": status_type,
             "text": reasoning
         },
         "roadmap": {
-            "career_priority": final_p,
-            "buffer_attendance": final_g
+            "career_priority": [format_day(s.day) for s in career],
+            "buffer_attendance": [format_day(s.day) for s in buffer]
+        },
+        "career_priority_dates": [
+            classify(s, "career_priority", f"High-impact day for your {track} track") for s in career
+        ],
+        "buffer_dates": [
+            classify(s, "buffer", "Needed to reach the attendance goal") for s in buffer
+        ],
+        "skip_safe_dates": [
+            classify(s, "skip_safe", "Lowest-impact day outside your plan") for s in skip_safe
+        ]
+    }
+
+
+def cohort_query(request: BatchStrategyRequest) -> dict:
+    """Mongo filter for a batch request (usernames win over the cohort filter)"""
+    if request.usernames:
+        return {"role": "student", "username": {"$in": request.usernames}}
+    query = {"role": "student"}
+    if request.campus_id:
+        query["campus_id"] = request.campus_id
+    if request.department_id:
+        query["$or"] = [{"department_id": request.department_id}, {"department": request.department_id}]
+    if request.semester is not None:
+        query["semester"] = request.semester
+    return query
+
+
+@router.get("/strategy/export")
+async def export_strategic_roadmaps(campus_id: Optional[str] = None, department_id: Optional[str] = None,
+                                    semester: Optional[int] = None,
+                                    batch_size: int = Query(default=500, ge=1, le=5000)):
+    """
+    Stream every matching student's roadmap as NDJSON (one JSON object per
+    line) for nightly reporting. Students are read from a cursor in bounded
+    batches, so memory stays flat regardless of campus size.
+    """
+    db = get_db()
+    query = cohort_query(BatchStrategyRequest(campus_id=campus_id, department_id=department_id, semester=semester))
+    events_version, fest_dates = await event_index.snapshot(db)
+    today = date.today()
+
+    async def generate():
+        cursor = db.users.find(query, {"_id": 0, "password_hash": 0}).batch_size(batch_size)
+        async for user in cursor:
+            plan = await date_plan_for(db, user, events_version, fest_dates, today)
+            roadmap = {"username": user.get("username"), **build_roadmap(user, plan)}
+            yield json.dumps(roadmap, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@router.get("/strategy/{username}")
+async def get_strategic_roadmap(username: str):
+    db = get_db()
+    user = await db.users.find_one({"username": username})
+    if not user:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    # Cached event index, no collection scan
+    events_version, fest_dates = await event_index.snapshot(db)
+    plan = await date_plan_for(db, user, events_version, fest_dates, date.today())
+    return build_roadmap(user, plan)
+
+
+@router.post("/strategy/batch")
+async def get_strategic_roadmaps_batch(request: BatchStrategyRequest):
+    """
+    Roadmaps for a whole cohort in one pass: one users query, one event
+    snapshot, one date plan per section/track and vectorized gap math.
+    """
+    if not (request.usernames or request.campus_id or request.department_id or request.semester is not None):
+        raise HTTPException(status_code=400, detail="Provide usernames or at least one cohort filter")
+
+    db = get_db()
+    users = await db.users.find(cohort_query(request), {"_id": 0, "password_hash": 0}).to_list(None)
+    events_version, fest_dates = await event_index.snapshot(db)
+    today = date.today()
+
+    # Group students by their shared plan
+    groups = {}
+    for user in users:
+        plan = await date_plan_for(db, user, events_version, fest_dates, today)
+        groups.setdefault(id(plan), (plan, []))[1].append(user)
+
+    roadmaps = {}
+    for plan, members in groups.values():
+        attended = np.fromiter((u.get("attended", 0) for u in members), dtype=np.int64, count=len(members))
+        gaps = np.maximum(0, required_days(plan) - attended)
+        for user, gap in zip(members, gaps.tolist()):
+            roadmaps[user["username"]] = {"username": user["username"], **build_roadmap(user, plan, gap)}
+
+    # Keep the caller's order for explicit username lists
+    order = request.usernames or [u["username"] for u in users]
+    missing = [name for name in order if name not in roadmaps]
+    return {
+        "count": len(roadmaps),
+        "roadmaps": [roadmaps[name] for name in order if name in roadmaps],
+        "missing": missing,
+    }
+
+
+@router.post("/simulate")
+async def simulate_leave_plans(request: LeaveSimulationRequest):
+    """
+    What-if simulator: for every candidate leave plan, the best attendance
+    the student can still finish with (attending every other remaining
+    working day) and whether the goal stays reachable.
+    """
+    db = get_db()
+    user = await db.users.find_one({"username": request.student_id})
+    if not user:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    plans = request.leave_plans or [request.upcoming_leave_dates or []]
+    events_version, fest_dates = await event_index.snapshot(db)
+    calendar = semester_calendar_for(user, events_version, fest_dates)
+
+    today = date.today()
+    horizon = min(request.semester_end_date, SEMESTER_END)
+    total_working = calendar.count()
+    remaining = calendar.count(today, horizon)
+    attended = user.get("attended", 0)
+    required = math.ceil(GOAL_PCT / 100 * total_working)
+
+    # One vectorized pass over every plan
+    missed = calendar.count_in_sets(plans, today, horizon)
+    best_final = attended + remaining - missed
+    projected_pct = np.round(best_final / max(total_working, 1) * 100, 1)
+    shortfall = np.maximum(0, required - best_final)
+
+    results = [
+        {
+            "leave_dates": [d.isoformat() for d in sorted(set(plan))],
+            "working_days_missed": int(missed[i]),
+            "projected_pct": float(projected_pct[i]),
+            "is_feasible": bool(shortfall[i] == 0),
+            "classes_short": int(shortfall[i]),
         }
+        for i, plan in enumerate(plans)
+    ]
+    return {
+        "student_id": request.student_id,
+        "goal_pct": GOAL_PCT,
+        "classes_attended": attended,
+        "total_working_days": total_working,
+        "days_remaining": remaining,
+        "max_skippable": max(0, attended + remaining - required),
+        "plans": results,
+    }
+
+
+@router.get("/subject-plan/{student_id}")
+async def get_subject_attendance_plan(student_id: str):
+    """
+    Minimum set of upcoming days that keeps every subject at or above the
+    student's target attendance, computed for all subjects at once.
+    """
+    db = get_db()
+    student = await find_student(db, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    target_pct = student.get("target_attendance", GOAL_PCT)
+    schedule = await section_schedule(db, student)
+    totals = await subject_totals(db, student_id)
+    subjects = sorted(set(schedule.subjects) | set(totals))
+    today = date.today()
+
+    held = np.array([totals.get(s, (0, 0))[0] for s in subjects], dtype=np.int64)
+    attended = np.array([totals.get(s, (0, 0))[1] for s in subjects], dtype=np.int64)
+    ordinals, coverage = schedule.coverage(subjects, today)
+    remaining = coverage.sum(axis=0)
+
+    need = solver.sessions_needed(attended, held, remaining, target_pct)
+    result = solver.solve(coverage, need)
+    final_total = held + remaining
+
+    return {
+        "student_id": student_id,
+        "target_pct": target_pct,
+        "days_to_attend": [
+            date.fromordinal(int(ordinals[i])).isoformat() for i in result.chosen_days
+        ],
+        "days_remaining": len(ordinals),
+        "skippable_days": len(ordinals) - len(result.chosen_days),
+        "is_feasible": bool(result.feasible.all()),
+        "subjects": [
+            {
+                "subject_code": s,
+                "classes_held": int(held[i]),
+                "classes_attended": int(attended[i]),
+                "sessions_remaining": int(remaining[i]),
+                "sessions_needed": int(need[i]),
+                "sessions_planned": int(result.planned[i]),
+                "projected_pct": solver.percentage(int(attended[i] + result.planned[i]), int(final_total[i])),
+                "is_feasible": bool(result.feasible[i]),
+            }
+            for i, s in enumerate(subjects)
+        ],
+    }
+
+
+def describe_window(window: Optional[Window], origin: date, budget: int) -> Optional[dict]:
+    if window is None:
+        return None
+    start = origin + timedelta(days=window.start)
+    return {
+        "start": start.isoformat(),
+        "end": (start + timedelta(days=window.length - 1)).isoformat(),
+        "calendar_days": window.length,
+        "working_days_missed": window.working_days,
+        "career_sessions_missed": window.career_sessions,
+        "keeps_target": window.working_days <= budget,
+    }
+
+
+@router.get("/leave-window/{username}")
+async def plan_leave_window(username: str, days: Optional[int] = Query(default=None, ge=1, le=60)):
+    """
+    Longest contiguous block the student can skip and still reach the goal,
+    and (with ?days=N) the N-day window that misses the fewest career sessions.
+    """
+    db = get_db()
+    user = await db.users.find_one({"username": username})
+    if not user:
+        raise HTTPException(status_code=404, detail="Student not found")
+
+    events_version, fest_dates = await event_index.snapshot(db)
+    today = date.today()
+    plan = await date_plan_for(db, user, events_version, fest_dates, today)
+    budget = user.get("attended", 0) + plan.remaining_count - required_days(plan)
+
+    # Per-calendar-day cost arrays from today to the end of the semester
+    span = max(0, (SEMESTER_END - today).days + 1)
+    working = np.zeros(span, dtype=np.int64)
+    career = np.zeros(span, dtype=np.int64)
+    for scored in plan.days:
+        offset = (scored.day - today).days
+        working[offset] = 1
+        if plan.is_career_day(scored):
+            career[offset] = max(1, len(scored.career_subjects))
+
+    return {
+        "username": username,
+        "skip_budget": max(0, budget),
+        "is_feasible": budget >= 0,
+        "longest_block": describe_window(longest_skippable(working, career, budget), today, budget),
+        "best_window": describe_window(cheapest_window(working, career, days, budget), today, budget) if days else None,
     }
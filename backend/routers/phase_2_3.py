@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List
-from datetime import datetime
+from datetime import date, datetime
 from database import get_db
+from semester import section_schedule
+from attendance_store import subject_totals
 import math
 
 router = APIRouter()
@@ -31,14 +33,24 @@ async def get_exam_strategy(student_id: str):
         raise HTTPException(status_code=404, detail="Student not found")
         
     perf_records = await db.academic_performance.find({"student_id": student_id}).to_list(None)
+    schedule = await section_schedule(db, student)
+    totals = await subject_totals(db, student_id)
+    today = date.today()
     
     strategy_list = []
     total_stress = 0
     
     for record in perf_records:
-        # Pull attendance for this specific subject (mocking 100 classes total for pct calculation)
-        # In full system, this joins with the attendance collection
-        att_pct = (student.get("attended", 15) / 20) * 100 # example math
+        # Classes attended come from the subject's attendance counters and
+        # classes held from the section's expanded timetable; subjects with
+        # no attendance yet keep the old 15-of-20 assumption
+        held = schedule.held_before(record.get("subject_code"), today)
+        total, present = totals.get(record.get("subject_code"), (0, 0))
+        if total:
+            att_pct = present / max(held, total) * 100
+        else:
+            att_pct = student.get("attended", 15) / (held or 20) * 100
+        att_pct = min(100, att_pct)
         total_marks = record.get("total_internal", 0)
         
         # Stress Score = (MissedClasses% * 0.4) + (InternalMarksGap% * 0.6)
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Body, Response
 from models import SubjectCreate, AttendanceBulkUpdate, AcademicPerformance
 from pydantic import BaseModel, Field
 from database import get_db
-from datetime import date, datetime
+from attendance_store import find_attendance, ingest_attendance, summarize_outcomes
+from marks_store import MARKS_CHUNK_SIZE, read_with_hash, students_by_id, subjects_by_code, upsert_marks
+from job_queue import JobQueue
+from config import settings
+from bson import ObjectId
+from scheduling.career_matcher import career_matcher
+from datetime import date, datetime, timedelta
+from typing import List
 import csv
 import io
 
 router = APIRouter()
 
+# Large CSV uploads are processed in the background, a few at a time
+upload_queue = JobQueue(concurrency=settings.MARK_UPLOAD_CONCURRENCY, name="mark uploads")
+
 
 class AttendanceUpdate(BaseModel):
     student_id: str
@@ -49,7 +59,11 @@ async def create_subject(subject: SubjectCreate):
     existing = await db.subjects.find_one({"subject_code": subject.subject_code})
     if existing:
         raise HTTPException(status_code=400, detail="Subject code already exists")
-    result = await db.subjects.insert_one(subject.model_dump())
+    data = subject.model_dump()
+    result = await db.subjects.insert_one(data)
+    # Every worker reclassifies subjects, and re-keys its cached roadmap
+    # plans, once it sees the bumped subjects version
+    await career_matcher.subject_added(db, data)
     return {"id": str(result.inserted_id), "message": "Subject created successfully"}
 
 
@@ -74,7 +88,7 @@ async def get_subject(subject_code: str):
 @router.post("/attendance/bulk")
 async def bulk_update_attendance(update: AttendanceBulkUpdate):
     db = get_db()
-    ops = []
+    records = []
     for student_id, status in update.student_statuses.items():
         record = {
             "student_id": student_id,
@@ -82,27 +96,212 @@ async def bulk_update_attendance(update: AttendanceBulkUpdate):
             "date": update.date.isoformat(),
             "status": status.value,
         }
-        ops.append(record)
-    if ops:
-        await db.attendance.insert_many(ops)
-    return {"message": f"Attendance recorded for {len(ops)} students"}
+        records.append(record)
+    # Upserts: re-submitting the same roll call does not duplicate rows
+    outcomes = await ingest_attendance(db, records)
+    return {
+        "message": f"Attendance recorded for {len(records)} students",
+        "summary": summarize_outcomes(outcomes),
+    }
 
 
 @router.get("/attendance/{subject_code}/{date_str}")
 async def get_attendance_by_date(subject_code: str, date_str: str):
     db = get_db()
-    records = []
-    async for r in db.attendance.find({"subject_code": subject_code, "date": date_str}):
-        records.append(_serialize(r))
-    return records
+    return await find_attendance(db, subject_code=subject_code, day=date_str)
 
 
 # ════════════════════════════════════════════════════════════════════════════════
 # PHASE 2-3: TEACHER MARKS UPLOAD
 # ════════════════════════════════════════════════════════════════════════════════
 
+UNFINISHED_UPLOAD = {"$in": ["queued", "running"]}
+
+
+async def _update_job(db, job_id, **fields):
+    # updated_at doubles as the heartbeat the stale-job sweep looks at
+    await db.mark_uploads.update_one({"_id": job_id}, {"$set": {**fields, "updated_at": datetime.utcnow()}})
+
+
+async def _interrupt_jobs(db, query: dict) -> int:
+    now = datetime.utcnow()
+    result = await db.mark_uploads.update_many(
+        {**query, "status": UNFINISHED_UPLOAD},
+        {"$set": {"status": "interrupted", "error": "Server stopped before the upload finished; upload the file again",
+                  "finished_at": now, "updated_at": now}},
+    )
+    return result.modified_count
+
+
+async def interrupt_upload_jobs(db) -> int:
+    """On shutdown: mark this process's queued and running uploads interrupted"""
+    return await _interrupt_jobs(db, {"worker": upload_queue.owner})
+
+
+async def sweep_stale_upload_jobs(db) -> int:
+    """
+    On startup: mark interrupted any queued/running upload that has made no
+    progress for MARK_UPLOAD_STALE_MINUTES (its worker died without shutting
+    down cleanly)
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.MARK_UPLOAD_STALE_MINUTES)
+    return await _interrupt_jobs(db, {"$or": [
+        {"updated_at": {"$lt": cutoff}},
+        {"updated_at": {"$exists": False}, "upload_date": {"$lt": cutoff}},
+    ]})
+
+
+async def _process_marks_csv(db, subject: dict, content: bytes, job_id=None) -> dict:
+    """
+    Validate and upsert a marks CSV chunk by chunk. With a job id, progress
+    (rows processed, successes, errors) is written to its mark_uploads record
+    after every chunk.
+    """
+    subject_code = subject["subject_code"]
+    rows = list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+    if job_id is not None:
+        await _update_job(db, job_id, status="running", total_rows=len(rows), started_at=datetime.utcnow())
+
+    records_inserted = []
+    errors = []  # (row_idx, message), reported in row order
+    for start in range(0, len(rows), MARKS_CHUNK_SIZE):
+        candidates = []
+        
+        # Pass 1: per-row format validation, no database access
+        for row_idx, row in enumerate(rows[start:start + MARKS_CHUNK_SIZE], start=start + 2):  # row 1 is header
+            try:
+                student_id = row.get('student_id', '').strip()
+                mid_term = float(row.get('mid_term_marks', 0))
+                cie = float(row.get('cie_marks', 0))
+                subject_name = row.get('subject_name', subject['subject_name']).strip()
+                
+                # Validate
+                if not student_id:
+                    errors.append((row_idx, f"Row {row_idx}: Missing student_id"))
+                    continue
+                if not (0 <= mid_term <= 30):
+                    errors.append((row_idx, f"Row {row_idx}: mid_term_marks must be 0-30 (got {mid_term})"))
+                    continue
+                if not (0 <= cie <= 20):
+                    errors.append((row_idx, f"Row {row_idx}: cie_marks must be 0-20 (got {cie})"))
+                    continue
+                candidates.append((row_idx, student_id, subject_name, mid_term, cie))
+                
+            except ValueError as e:
+                errors.append((row_idx, f"Row {row_idx}: Invalid numeric value - {str(e)}"))
+            except Exception as e:
+                errors.append((row_idx, f"Row {row_idx}: {str(e)}"))
+        
+        # Pass 2: verify every referenced student with one $in query
+        students = await students_by_id(db, (c[1] for c in candidates))
+        labels, docs = [], []
+        upload_date = datetime.utcnow()
+        for idx, student_id, subject_name, mid_term, cie in candidates:
+            student = students.get(student_id)
+            if not student:
+                errors.append((idx, f"Row {idx}: Student {student_id} not found in system"))
+                continue
+            labels.append(idx)
+            docs.append({
+                "student_id": student_id,
+                "subject_code": subject_code,
+                "subject_name": subject_name,
+                "mid_term_marks": mid_term,
+                "cie_marks": cie,
+                "total_internal": mid_term + cie,
+                "semester": student.get("semester", 1),
+                "uploaded_by_teacher": subject['teacher_id'],
+                "upload_date": upload_date,
+            })
+        
+        # Pass 3: create or update performance records in bulk
+        # (rows identical to what is stored are not rewritten)
+        for idx, doc, outcome in zip(labels, docs, await upsert_marks(db, docs, skip_unchanged=True)):
+            if outcome["status"] == "error":
+                errors.append((idx, f"Row {idx}: {outcome['detail']}"))
+                continue
+            records_inserted.append({
+                "student_id": doc["student_id"],
+                "total_internal": doc["total_internal"],
+                "status": outcome["status"],
+            })
+        
+        if job_id is not None:
+            await _update_job(db, job_id, processed_rows=min(len(rows), start + MARKS_CHUNK_SIZE),
+                              successful_uploads=len(records_inserted), errors=len(errors),
+                              unchanged_rows=sum(r["status"] == "unchanged" for r in records_inserted))
+    
+    return {
+        "total_rows": len(rows),
+        "records_inserted": records_inserted,
+        "errors": [message for _, message in sorted(errors)],
+    }
+
+
+async def _run_upload_job(db, job_id, subject: dict, content: bytes) -> dict:
+    """Process one queued upload, leaving its final state in mark_uploads"""
+    try:
+        result = await _process_marks_csv(db, subject, content, job_id)
+    except Exception as e:
+        await _update_job(db, job_id, status="failed", error=f"Error processing file: {str(e)}",
+                          finished_at=datetime.utcnow())
+        raise
+    await _update_job(
+        db, job_id,
+        status="completed",
+        total_rows=result["total_rows"],
+        processed_rows=result["total_rows"],
+        successful_uploads=len(result["records_inserted"]),
+        unchanged_rows=sum(r["status"] == "unchanged" for r in result["records_inserted"]),
+        errors=len(result["errors"]),
+        error_details=result["errors"][:10],  # Store first 10 errors
+        finished_at=datetime.utcnow(),
+    )
+    return result
+
+
+def _is_repeat_upload(latest, content_hash: str) -> bool:
+    """
+    Whether the subject's most recent upload already covers this file: it
+    completed, or it is still queued/running in this process. Anything else
+    (an older upload, a failure, a job orphaned by a restart) is re-processed,
+    where the row-wise diff skips whatever is already stored.
+    """
+    if latest is None or latest.get("content_hash") != content_hash:
+        return False
+    status = latest.get("status")
+    return status == "completed" or (status in ("queued", "running")
+                                     and latest.get("worker") == upload_queue.owner)
+
+
+def _duplicate_upload_response(previous: dict, file_name: str, wait: bool) -> dict:
+    """Earlier upload of the same file, in the shape the caller asked for"""
+    job_id = str(previous["_id"])
+    if wait and previous.get("status") == "completed":
+        return {
+            "message": "Identical file already uploaded; nothing changed",
+            "job_id": job_id,
+            "duplicate": True,
+            "file": file_name,
+            "total_records": previous.get("total_rows"),
+            "successful": previous.get("successful_uploads", 0),
+            "failed": previous.get("errors", 0),
+            "errors": previous.get("error_details", []),
+            "inserted_records": [],
+        }
+    return {
+        "message": "Identical file already uploaded",
+        "job_id": job_id,
+        "duplicate": True,
+        "file": file_name,
+        "status": previous.get("status"),
+        "status_url": f"/api/teachers/upload-jobs/{job_id}",
+    }
+
+
 @router.post("/upload-marks/csv")
-async def upload_marks_csv(subject_code: str, file: UploadFile = File(...)):
+async def upload_marks_csv(subject_code: str, response: Response, file: UploadFile = File(...),
+                           wait: bool = False, force: bool = False):
     """
     Upload student marks via CSV file.
     
@@ -115,6 +314,15 @@ async def upload_marks_csv(subject_code: str, file: UploadFile = File(...)):
     mid_term_marks: 0-30
     cie_marks: 0-20
     total_internal: sum of both (0-50)
+    
+    The file is queued for background processing and a job id is returned
+    at once (202); poll GET /upload-jobs/{job_id} for progress. Pass
+    wait=true to process within the request and get the full result.
+    
+    Files are fingerprinted (SHA-256): re-uploading the file behind the
+    subject's latest completed (or still running) upload returns that upload
+    instead of re-processing it (force=true overrides), and any other file
+    only writes the rows whose values differ from what is stored.
     """
     db = get_db()
     
@@ -124,89 +332,53 @@ async def upload_marks_csv(subject_code: str, file: UploadFile = File(...)):
         if not subject:
             raise HTTPException(status_code=404, detail=f"Subject {subject_code} not found")
         
-        # Read CSV file
-        content = await file.read()
-        csv_reader = csv.DictReader(io.StringIO(content.decode('utf-8')))
+        # Read CSV file (the upload is gone once this request returns)
+        content, content_hash = await read_with_hash(file)
         
-        records_inserted = []
-        errors = []
-        row_idx = 1
+        latest = None if force else await db.mark_uploads.find_one(
+            {"subject_code": subject_code}, sort=[("upload_date", -1)],
+        )
+        if _is_repeat_upload(latest, content_hash):
+            return _duplicate_upload_response(latest, file.filename, wait)
         
-        for row_idx, row in enumerate(csv_reader, start=2):  # Start at 2 (row 1 is header)
-            try:
-                student_id = row.get('student_id', '').strip()
-                mid_term = float(row.get('mid_term_marks', 0))
-                cie = float(row.get('cie_marks', 0))
-                subject_name = row.get('subject_name', subject['subject_name']).strip()
-                
-                # Validate
-                if not student_id:
-                    errors.append(f"Row {row_idx}: Missing student_id")
-                    continue
-                if not (0 <= mid_term <= 30):
-                    errors.append(f"Row {row_idx}: mid_term_marks must be 0-30 (got {mid_term})")
-                    continue
-                if not (0 <= cie <= 20):
-                    errors.append(f"Row {row_idx}: cie_marks must be 0-20 (got {cie})")
-                    continue
-                
-                # Verify student exists
-                student = await db.students.find_one({"student_id": student_id})
-                if not student:
-                    errors.append(f"Row {row_idx}: Student {student_id} not found in system")
-                    continue
-                
-                # Create or update performance record
-                total_internal = mid_term + cie
-                data = {
-                    "student_id": student_id,
-                    "subject_code": subject_code,
-                    "subject_name": subject_name,
-                    "mid_term_marks": mid_term,
-                    "cie_marks": cie,
-                    "total_internal": total_internal,
-                    "semester": student.get("semester", 1),
-                    "uploaded_by_teacher": subject['teacher_id'],
-                    "upload_date": datetime.utcnow(),
-                }
-                
-                result = await db.academic_performance.update_one(
-                    {
-                        "student_id": student_id,
-                        "subject_code": subject_code,
-                    },
-                    {"$set": data},
-                    upsert=True,
-                )
-                
-                records_inserted.append({
-                    "student_id": student_id,
-                    "total_internal": total_internal,
-                    "status": "inserted" if result.upserted_id else "updated"
-                })
-                
-            except ValueError as e:
-                errors.append(f"Row {row_idx}: Invalid numeric value - {str(e)}")
-            except Exception as e:
-                errors.append(f"Row {row_idx}: {str(e)}")
-        
-        # Save upload metadata
+        # Upload metadata doubles as the job record
+        submitted = datetime.utcnow()
         upload_record = {
             "teacher_id": subject['teacher_id'],
             "subject_code": subject_code,
             "file_name": file.filename,
-            "total_rows": row_idx - 1 if row_idx > 1 else 0,
-            "successful_uploads": len(records_inserted),
-            "errors": len(errors),
-            "upload_date": datetime.utcnow(),
-            "error_details": errors[:10],  # Store first 10 errors
+            "status": "queued",
+            "total_rows": None,
+            "processed_rows": 0,
+            "successful_uploads": 0,
+            "errors": 0,
+            "upload_date": submitted,
+            "updated_at": submitted,
+            "error_details": [],
+            "content_hash": content_hash,
+            "file_size": len(content),
+            "worker": upload_queue.owner,
         }
-        await db.mark_uploads.insert_one(upload_record)
+        job_id = (await db.mark_uploads.insert_one(upload_record)).inserted_id
         
+        if not wait:
+            queued = upload_queue.submit(lambda: _run_upload_job(db, job_id, subject, content))
+            response.status_code = 202
+            return {
+                "message": "Marks upload queued",
+                "job_id": str(job_id),
+                "file": file.filename,
+                "queue_position": queued,
+                "status_url": f"/api/teachers/upload-jobs/{job_id}",
+            }
+        
+        result = await _run_upload_job(db, job_id, subject, content)
+        records_inserted, errors = result["records_inserted"], result["errors"]
         return {
             "message": "Marks uploaded successfully",
+            "job_id": str(job_id),
             "file": file.filename,
-            "total_records": row_idx - 1 if row_idx > 1 else 0,
+            "total_records": result["total_rows"],
             "successful": len(records_inserted),
             "failed": len(errors),
             "errors": errors[:10],  # Return first 10 errors to user
@@ -218,7 +390,7 @@ async def upload_marks_csv(subject_code: str, file: UploadFile = File(...)):
 
 
 @router.post("/upload-marks/bulk")
-async def upload_marks_bulk(marks: list):
+async def upload_marks_bulk(marks: List[dict] = Body(...)):
     """
     Upload multiple student marks as JSON payload.
     
@@ -240,8 +412,10 @@ async def upload_marks_bulk(marks: list):
         raise HTTPException(status_code=400, detail="No marks provided")
     
     records_inserted = []
-    errors = []
+    errors = []  # (idx, message), reported in entry order
+    candidates = []
     
+    # Pass 1: per-entry format validation, no database access
     for idx, mark_entry in enumerate(marks):
         try:
             student_id = mark_entry.get('student_id', '').strip()
@@ -252,60 +426,60 @@ async def upload_marks_bulk(marks: list):
             
             # Validate
             if not student_id or not subject_code:
-                errors.append(f"Entry {idx + 1}: Missing student_id or subject_code")
+                errors.append((idx, f"Entry {idx + 1}: Missing student_id or subject_code"))
                 continue
             if not (0 <= mid_term <= 30):
-                errors.append(f"Entry {idx + 1}: mid_term_marks must be 0-30")
+                errors.append((idx, f"Entry {idx + 1}: mid_term_marks must be 0-30"))
                 continue
             if not (0 <= cie <= 20):
-                errors.append(f"Entry {idx + 1}: cie_marks must be 0-20")
-                continue
-            
-            # Verify student and subject
-            student = await db.students.find_one({"student_id": student_id})
-            subject = await db.subjects.find_one({"subject_code": subject_code})
-            
-            if not student:
-                errors.append(f"Entry {idx + 1}: Student {student_id} not found")
-                continue
-            if not subject:
-                errors.append(f"Entry {idx + 1}: Subject {subject_code} not found")
+                errors.append((idx, f"Entry {idx + 1}: cie_marks must be 0-20"))
                 continue
-            
-            # Create or update
-            total_internal = mid_term + cie
-            data = {
-                "student_id": student_id,
-                "subject_code": subject_code,
-                "subject_name": subject_name or subject['subject_name'],
-                "mid_term_marks": mid_term,
-                "cie_marks": cie,
-                "total_internal": total_internal,
-                "semester": student.get("semester", 1),
-                "uploaded_by_teacher": subject['teacher_id'],
-                "upload_date": datetime.utcnow(),
-            }
-            
-            result = await db.academic_performance.update_one(
-                {
-                    "student_id": student_id,
-                    "subject_code": subject_code,
-                },
-                {"$set": data},
-                upsert=True,
-            )
-            
-            records_inserted.append({
-                "student_id": student_id,
-                "subject_code": subject_code,
-                "total_internal": total_internal,
-                "status": "inserted" if result.upserted_id else "updated"
-            })
+            candidates.append((idx, student_id, subject_code, subject_name, mid_term, cie))
             
         except ValueError:
-            errors.append(f"Entry {idx + 1}: Invalid numeric values")
+            errors.append((idx, f"Entry {idx + 1}: Invalid numeric values"))
         except Exception as e:
-            errors.append(f"Entry {idx + 1}: {str(e)}")
+            errors.append((idx, f"Entry {idx + 1}: {str(e)}"))
+    
+    # Pass 2: verify students and subjects with one $in query each
+    students = await students_by_id(db, (c[1] for c in candidates))
+    subjects = await subjects_by_code(db, (c[2] for c in candidates))
+    labels, docs = [], []
+    upload_date = datetime.utcnow()
+    for idx, student_id, subject_code, subject_name, mid_term, cie in candidates:
+        student = students.get(student_id)
+        subject = subjects.get(subject_code)
+        if not student:
+            errors.append((idx, f"Entry {idx + 1}: Student {student_id} not found"))
+            continue
+        if not subject:
+            errors.append((idx, f"Entry {idx + 1}: Subject {subject_code} not found"))
+            continue
+        labels.append(idx)
+        docs.append({
+            "student_id": student_id,
+            "subject_code": subject_code,
+            "subject_name": subject_name or subject['subject_name'],
+            "mid_term_marks": mid_term,
+            "cie_marks": cie,
+            "total_internal": mid_term + cie,
+            "semester": student.get("semester", 1),
+            "uploaded_by_teacher": subject.get('teacher_id'),
+            "upload_date": upload_date,
+        })
+    
+    # Pass 3: create or update in bulk
+    for idx, doc, outcome in zip(labels, docs, await upsert_marks(db, docs)):
+        if outcome["status"] == "error":
+            errors.append((idx, f"Entry {idx + 1}: {outcome['detail']}"))
+            continue
+        records_inserted.append({
+            "student_id": doc["student_id"],
+            "subject_code": doc["subject_code"],
+            "total_internal": doc["total_internal"],
+            "status": outcome["status"],
+        })
+    errors = [message for _, message in sorted(errors)]
     
     if len(records_inserted) == 0:
         raise HTTPException(status_code=400, detail=f"No valid records to insert. Errors: {errors}")
@@ -320,6 +494,46 @@ async def upload_marks_bulk(marks: list):
     }
 
 
+@router.get("/upload-jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Progress of a queued marks upload: rows processed, errors and ETA"""
+    db = get_db()
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    job = await db.mark_uploads.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    
+    total = job.get("total_rows")
+    processed = job.get("processed_rows", 0)
+    status = job.get("status", "completed")  # uploads recorded before jobs existed
+    eta_seconds = None
+    if status == "running" and total and processed:
+        elapsed = (datetime.utcnow() - job["started_at"]).total_seconds()
+        eta_seconds = round(elapsed / processed * (total - processed), 1)
+    elif status == "completed":
+        eta_seconds = 0
+    
+    return {
+        "job_id": job_id,
+        "status": status,
+        "file": job.get("file_name"),
+        "subject_code": job.get("subject_code"),
+        "total_rows": total,
+        "processed_rows": processed if status != "completed" else total,
+        "percent_complete": round(processed / total * 100, 1) if total else (100.0 if status == "completed" else 0.0),
+        "successful": job.get("successful_uploads", 0),
+        "unchanged": job.get("unchanged_rows", 0),
+        "failed": job.get("errors", 0),
+        "errors": job.get("error_details", []),
+        "error": job.get("error"),
+        "eta_seconds": eta_seconds,
+        "submitted_at": job.get("upload_date"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
+
+
 @router.get("/upload-history/{subject_code}")
 async def get_upload_history(subject_code: str):
     """Get history of mark uploads for a subject"""
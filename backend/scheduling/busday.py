@@ -0,0 +1,30 @@
+"""
+NumPy business-day engine for EduPath Optimizer
+Compiles weekends, public holidays and university fests into a single
+numpy.busdaycalendar so a semester's working-day mask is one vectorized call
+"""
+
+from datetime import date, timedelta
+from typing import Iterable
+import numpy as np
+
+# Mon-Fri are teaching days
+DEFAULT_WEEKMASK = "1111100"
+
+
+def to_datetime64(days: Iterable[date]) -> np.ndarray:
+    """Convert an iterable of dates to a sorted, de-duplicated datetime64[D] array"""
+    return np.unique(np.array(list(days), dtype="datetime64[D]"))
+
+
+class BusdayEngine:
+    """Vectorized working-day mask over a compiled busdaycalendar"""
+
+    def __init__(self, blocked_days: Iterable[date], weekmask: str = DEFAULT_WEEKMASK):
+        self.weekmask = weekmask
+        self.busdaycal = np.busdaycalendar(weekmask=weekmask, holidays=to_datetime64(blocked_days))
+
+    def mask(self, start: date, end: date) -> np.ndarray:
+        """Boolean working-day mask for every calendar day in [start, end]"""
+        days = np.arange(start, end + timedelta(days=1), dtype="datetime64[D]")
+        return np.is_busday(days, busdaycal=self.busdaycal)
@@ -0,0 +1,98 @@
+"""
+On-disk calendar tables for EduPath Optimizer
+Working-day bitmaps are written once per (campus country, semester window,
+events version, holiday and fest dates) as versioned .npy files; every
+uvicorn worker maps them read-only so the pages are shared by the OS instead
+of rebuilt per process
+"""
+
+import hashlib
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, Optional
+import numpy as np
+
+# Bump when the on-disk layout or the working-day rules change
+TABLE_FORMAT_VERSION = 1
+
+
+def _digest(value) -> str:
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value)
+    return hashlib.sha1(repr(value).encode()).hexdigest()[:12]
+
+
+def _version_tag(version: Hashable, blocked: Iterable[date] = ()) -> str:
+    """
+    Events versions are ints; fest-date sets are hashed into a stable tag.
+    The blocked dates (public holidays and fests) are hashed in as well, so a
+    table persisted under the same events version by an older holiday
+    calendar or another database is never mapped.
+    """
+    tag = f"v{version}" if isinstance(version, int) else "h" + _digest(version)
+    return f"{tag}-{_digest(frozenset(blocked))}"
+
+
+class CalendarStore:
+    """Directory of memory-mapped working-day bitmaps"""
+
+    def __init__(self, directory: os.PathLike):
+        self.directory = Path(directory)
+
+    def _stem(self, country_code: str, subdiv: Optional[str], start: date, end: date) -> str:
+        return (f"calendar_f{TABLE_FORMAT_VERSION}_{country_code}_{subdiv or '-'}_"
+                f"{start:%Y%m%d}_{end:%Y%m%d}")
+
+    def path_for(self, country_code: str, subdiv: Optional[str], start: date, end: date,
+                 version: Hashable, blocked: Iterable[date] = ()) -> Path:
+        stem = self._stem(country_code, subdiv, start, end)
+        return self.directory / f"{stem}_{_version_tag(version, blocked)}.npy"
+
+    def load(self, path: Path) -> Optional[np.ndarray]:
+        """Read-only mapping of a table, or None if it is missing or unreadable"""
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def write(self, path: Path, bitmap: np.ndarray) -> None:
+        """
+        Write atomically (temp file + rename) so a worker never maps a
+        half-written table, then drop older versions of the same window.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.save(fh, np.asarray(bitmap, dtype=bool))
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+        stem = path.name.rsplit("_", 1)[0]
+        for stale in self.directory.glob(f"{stem}_*.npy"):
+            if stale != path:
+                try:
+                    # Workers still mapping the old file keep their pages
+                    stale.unlink()
+                except OSError:
+                    pass
+
+    def load_or_build(self, country_code: str, subdiv: Optional[str], start: date, end: date,
+                      version: Hashable, build: Callable[[], np.ndarray],
+                      blocked: Iterable[date] = ()) -> np.ndarray:
+        """Mapped table for this key, building and publishing it on first use"""
+        path = self.path_for(country_code, subdiv, start, end, version, blocked)
+        table = self.load(path)
+        if table is not None:
+            return table
+        try:
+            self.write(path, build())
+        except OSError:
+            # Read-only or full disk: fall back to a private in-memory table
+            return build()
+        return self.load(path) if path.exists() else build()
@@ -0,0 +1,139 @@
+"""
+Career-track subject matcher for EduPath Optimizer
+Compiles each track's keyword list into one regex and classifies every
+subject into tracks once, cached by subject_code, so date scoring is a set
+lookup instead of repeated substring scans. The cache is versioned through
+the `config` collection like the event index, so subjects created on one
+worker reach the others
+"""
+
+import asyncio
+import re
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional
+from pymongo import ReturnDocument
+
+# Other workers pick up new subjects after at most this many seconds
+SUBJECTS_REFRESH_SECONDS = 30
+
+VERSION_KEY = "subjects_version"
+
+# Career track → high-priority subject keywords
+CAREER_SUBJECT_MAP = {
+    "AI & ML": ["python", "ml", "machine learning", "neural", "data science"],
+    "Cyber Security": ["security", "network", "cryptography", "ethical", "cyber"],
+    "Web Dev": ["web", "html", "css", "javascript", "react", "node", "database"],
+    "IOT": ["embedded", "sensors", "arduino", "raspberry", "electronics"],
+    "General": []
+}
+
+# models.CareerTrack values stored on subject documents → track names above
+CAREER_TRACK_NAMES = {
+    "ai_ml": "AI & ML",
+    "cyber_security": "Cyber Security",
+    "web_development": "Web Dev",
+    "iot": "IOT",
+}
+
+
+def _compile(keywords: List[str]) -> re.Pattern:
+    # Longest keywords first so "machine learning" wins over shorter overlaps.
+    # A leading word boundary keeps "ml" out of "html" but still matches
+    # plurals such as "networks"
+    alternatives = sorted({re.escape(k.lower()) for k in keywords}, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+
+class CareerMatcher:
+    """Classifies subject names/codes into career tracks with cached results"""
+
+    def __init__(self, subject_map: Dict[str, List[str]], refresh_seconds: float = SUBJECTS_REFRESH_SECONDS):
+        self._patterns = {track: _compile(kw) for track, kw in subject_map.items() if kw}
+        self._by_name: Dict[str, FrozenSet[str]] = {}
+        self._by_code: Dict[str, FrozenSet[str]] = {}
+        self.refresh_seconds = refresh_seconds
+        self.version: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def tracks_for_name(self, name: str) -> FrozenSet[str]:
+        tracks = self._by_name.get(name)
+        if tracks is None:
+            tracks = frozenset(t for t, pattern in self._patterns.items() if pattern.search(name))
+            self._by_name[name] = tracks
+        return tracks
+
+    def add_subject(self, doc: dict) -> FrozenSet[str]:
+        """Classify one `subjects` document and cache it by subject_code"""
+        tracks = set(self.tracks_for_name(doc.get("subject_name") or ""))
+        for value in doc.get("career_tracks") or []:
+            value = getattr(value, "value", value)
+            if value in CAREER_TRACK_NAMES:
+                tracks.add(CAREER_TRACK_NAMES[value])
+        tracks = frozenset(tracks)
+        if doc.get("subject_code"):
+            self._by_code[doc["subject_code"]] = tracks
+        return tracks
+
+    def load_subjects(self, docs: Iterable[dict]):
+        self._by_name.clear()
+        self._by_code.clear()
+        for doc in docs:
+            self.add_subject(doc)
+
+    async def _read_version(self, db) -> int:
+        doc = await db.config.find_one({"key": VERSION_KEY})
+        return doc.get("version", 0) if doc else 0
+
+    async def _reload(self, db, version: int):
+        docs = await db.subjects.find(
+            {}, {"_id": 0, "subject_code": 1, "subject_name": 1, "career_tracks": 1}
+        ).to_list(None)
+        self.load_subjects(docs)
+        self.version = version
+
+    async def ensure_loaded(self, db) -> int:
+        """
+        Classify the subjects collection, re-reading it when another worker
+        has bumped the subjects version (checked at most once per refresh
+        window). Returns the version, for keying anything derived from it.
+        """
+        if self.version is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return self.version
+
+        async with self._lock:
+            if self.version is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+                version = await self._read_version(db)
+                if version != self.version:
+                    await self._reload(db, version)
+                self._checked_at = time.monotonic()
+        return self.version
+
+    async def subject_added(self, db, doc: dict) -> int:
+        """Write-through after a subject insert: bump the shared version"""
+        async with self._lock:
+            bumped = await db.config.find_one_and_update(
+                {"key": VERSION_KEY},
+                {"$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            if self.version is None or bumped["version"] != self.version + 1:
+                # Missed another writer's change; resync from the collection
+                await self._reload(db, bumped["version"])
+            else:
+                self.add_subject(doc)
+                self.version = bumped["version"]
+            self._checked_at = time.monotonic()
+        return self.version
+
+    def tracks_for(self, subject: str) -> FrozenSet[str]:
+        """Tracks for a timetable entry, which may be a subject code or a name"""
+        tracks = self._by_code.get(subject)
+        return tracks if tracks is not None else self.tracks_for_name(subject)
+
+    def is_career_subject(self, subject: str, track: str) -> bool:
+        return track in self.tracks_for(subject)
+
+
+career_matcher = CareerMatcher(CAREER_SUBJECT_MAP)
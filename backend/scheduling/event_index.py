@@ -0,0 +1,101 @@
+"""
+University event index for EduPath Optimizer
+Keeps the set of event/fest dates in memory with a monotonically increasing
+version so roadmap requests stop scanning the events collection
+"""
+
+import asyncio
+import time
+from collections import Counter
+from datetime import date
+from typing import FrozenSet, Optional, Tuple
+from pymongo import ReturnDocument
+
+# Other workers pick up admin writes after at most this many seconds
+EVENT_INDEX_REFRESH_SECONDS = 30
+
+VERSION_KEY = "events_version"
+
+
+def _event_day(value) -> date:
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class EventIndex:
+    """In-memory event date set, versioned through the `config` collection"""
+
+    def __init__(self, refresh_seconds: float = EVENT_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.version: Optional[int] = None
+        self._counts: Counter = Counter()
+        self._dates: FrozenSet[date] = frozenset()
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _read_version(self, db) -> int:
+        doc = await db.config.find_one({"key": VERSION_KEY})
+        return doc.get("version", 0) if doc else 0
+
+    async def _bump_version(self, db) -> int:
+        doc = await db.config.find_one_and_update(
+            {"key": VERSION_KEY},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["version"]
+
+    async def _reload(self, db, version: int):
+        counts = Counter()
+        async for e in db.events.find({}, {"event_date": 1}):
+            if e.get("event_date"):
+                counts[_event_day(e["event_date"])] += 1
+        self._counts = counts
+        self._dates = frozenset(counts)
+        self.version = version
+
+    async def snapshot(self, db) -> Tuple[int, FrozenSet[date]]:
+        """
+        Current (version, event dates). Only a point lookup on the version
+        document is made per refresh window; the collection is rescanned
+        only when another writer has bumped the version.
+        """
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.refresh_seconds:
+            return self.version, self._dates
+
+        async with self._lock:
+            if self.version is None or time.monotonic() - self._checked_at >= self.refresh_seconds:
+                version = await self._read_version(db)
+                if version != self.version:
+                    await self._reload(db, version)
+                self._checked_at = time.monotonic()
+        return self.version, self._dates
+
+    async def _apply(self, db, event_date, delta: int):
+        async with self._lock:
+            version = await self._bump_version(db)
+            if self.version is None or version != self.version + 1:
+                # Missed another writer's change; resync from the collection
+                await self._reload(db, version)
+            else:
+                day = _event_day(event_date)
+                self._counts[day] += delta
+                if self._counts[day] <= 0:
+                    del self._counts[day]
+                self._dates = frozenset(self._counts)
+                self.version = version
+            self._checked_at = time.monotonic()
+
+    async def add(self, db, event_date):
+        """Write-through after an event insert"""
+        await self._apply(db, event_date, 1)
+
+    async def remove(self, db, event_date):
+        """Write-through after an event delete"""
+        await self._apply(db, event_date, -1)
+
+
+event_index = EventIndex()
@@ -0,0 +1,41 @@
+"""
+Public holiday registry for EduPath Optimizer
+Memoizes holiday rule evaluation per (country, subdivision, year) so the
+`holidays` package only parses its rule sets once per process
+"""
+
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Optional
+import holidays
+
+HOLIDAY_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=HOLIDAY_CACHE_SIZE)
+def holiday_ordinals(country_code: str, subdiv: Optional[str], year: int) -> FrozenSet[int]:
+    """Frozen set of date ordinals that are public holidays in one year"""
+    calendar = holidays.country_holidays(country_code, subdiv=subdiv, years=year)
+    return frozenset(d.toordinal() for d in calendar)
+
+
+def get_holiday_ordinals(country_code: str, years: Iterable[int],
+                         subdiv: Optional[str] = None) -> FrozenSet[int]:
+    """Union of the cached per-year ordinal sets"""
+    ordinals = frozenset()
+    for year in sorted(set(years)):
+        ordinals = ordinals | holiday_ordinals(country_code, subdiv, year)
+    return ordinals
+
+
+def warm_up(country_codes: Iterable[str], years: Iterable[int]) -> int:
+    """Pre-build holiday sets at startup; returns the number of (country, year) entries loaded"""
+    loaded = 0
+    for country_code in sorted(set(country_codes)):
+        for year in years:
+            try:
+                holiday_ordinals(country_code, None, year)
+                loaded += 1
+            except NotImplementedError:
+                print(f"Unknown holiday country code: {country_code}")
+                break
+    return loaded
@@ -0,0 +1,71 @@
+"""
+Leave-window search for EduPath Optimizer
+Sliding-window / two-pointer scans over per-calendar-day cost arrays:
+the longest block a student can skip within their attendance budget, and
+the N-day window that misses the fewest career sessions
+"""
+
+from typing import NamedTuple, Optional
+import numpy as np
+
+
+class Window(NamedTuple):
+    start: int                 # offset of the first calendar day
+    length: int                # calendar days in the window
+    working_days: int          # working days missed
+    career_sessions: int       # career-track sessions missed
+
+
+def _window(start: int, length: int, working_prefix: np.ndarray, career_prefix: np.ndarray) -> Window:
+    end = start + length
+    return Window(start, length,
+                  int(working_prefix[end] - working_prefix[start]),
+                  int(career_prefix[end] - career_prefix[start]))
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    prefix = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+
+def longest_skippable(working: np.ndarray, career: np.ndarray, budget: int) -> Optional[Window]:
+    """
+    Longest run of consecutive calendar days containing at most `budget`
+    working days (two pointers, O(n)). Earliest window wins ties.
+    """
+    if budget < 0 or len(working) == 0:
+        return None
+    working = np.asarray(working, dtype=np.int64)
+    best_start, best_len = 0, 0
+    left = 0
+    missed = 0
+    for right in range(len(working)):
+        missed += working[right]
+        while missed > budget:
+            missed -= working[left]
+            left += 1
+        if right - left + 1 > best_len:
+            best_start, best_len = left, right - left + 1
+    if best_len == 0:
+        return None
+    return _window(best_start, best_len, _prefix(working), _prefix(career))
+
+
+def cheapest_window(working: np.ndarray, career: np.ndarray, length: int, budget: int) -> Optional[Window]:
+    """
+    The `length`-day window missing the fewest career sessions, preferring
+    windows that stay within the skip budget, then fewer working days missed,
+    then the earliest start. All window sums come from one prefix-sum pass.
+    """
+    if length <= 0 or length > len(working):
+        return None
+    working_prefix = _prefix(np.asarray(working, dtype=np.int64))
+    career_prefix = _prefix(np.asarray(career, dtype=np.int64))
+    working_cost = working_prefix[length:] - working_prefix[:-length]
+    career_cost = career_prefix[length:] - career_prefix[:-length]
+
+    over_budget = (working_cost > budget).astype(np.int64)
+    # lexsort: last key is primary
+    order = np.lexsort((np.arange(len(career_cost)), working_cost, career_cost, over_budget))
+    return _window(int(order[0]), length, working_prefix, career_prefix)
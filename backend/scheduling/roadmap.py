@@ -0,0 +1,113 @@
+"""
+Section-level roadmap date plans for EduPath Optimizer
+Working days and their impact scores are identical for every student of a
+section and career track, so they are computed once per (section, track,
+semester, events version, day) and each student request only does gap
+arithmetic and a top-k heap selection
+"""
+
+import heapq
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from .semester_calendar import SemesterCalendar
+
+MAX_CACHED_PLANS = 256
+
+# Impact weights per scheduled session
+CAREER_WEIGHT = 3.0
+SUBJECT_WEIGHT = 1.0
+
+# Lowest-impact days returned as safe to skip
+SKIP_SAFE_LIMIT = 10
+
+_plan_cache: "OrderedDict[tuple, DatePlan]" = OrderedDict()
+
+
+def format_day(day: date) -> str:
+    return day.strftime("%d-%m-%Y")
+
+
+class ScoredDay(NamedTuple):
+    day: date
+    subjects: Tuple[str, ...]
+    career_subjects: Tuple[str, ...]
+    impact_score: float
+
+
+def _rank(scored: ScoredDay):
+    # Higher impact first; earlier date wins ties
+    return scored.impact_score, -scored.day.toordinal()
+
+
+class DatePlan:
+    """Shared, impact-scored date plan of one section/track for the rest of the semester"""
+
+    def __init__(self, calendar: SemesterCalendar, today: date,
+                 timetable: Optional[Dict[int, List[str]]] = None,
+                 is_career_subject: Callable[[str], bool] = lambda name: False,
+                 career_weekdays: Iterable[int] = ()):
+        self.total_working = calendar.count()
+        self.remaining_count = calendar.remaining(today)
+        career_weekdays = set(career_weekdays)
+
+        # Score each weekday once; every date on that weekday shares it
+        by_weekday = {}
+        for weekday in range(5):
+            if timetable:
+                subjects = tuple(timetable.get(weekday) or ())
+                career = tuple(s for s in subjects if is_career_subject(s))
+                score = CAREER_WEIGHT * len(career) + SUBJECT_WEIGHT * (len(subjects) - len(career))
+            else:
+                # No timetable: fall back to fixed career weekdays
+                subjects, career = (), ()
+                score = CAREER_WEIGHT if weekday in career_weekdays else SUBJECT_WEIGHT
+            by_weekday[weekday] = (subjects, career, score)
+
+        self.days: List[ScoredDay] = [
+            ScoredDay(d, *by_weekday[d.weekday()])
+            for d in calendar.working_days(today, calendar.end)
+        ]
+        self.fallback_career_weekdays = career_weekdays if not timetable else set()
+
+    def is_career_day(self, scored: ScoredDay) -> bool:
+        return bool(scored.career_subjects) or scored.day.weekday() in self.fallback_career_weekdays
+
+    def select(self, gap: int) -> Tuple[List[ScoredDay], List[ScoredDay], List[ScoredDay]]:
+        """
+        Pick the `gap` highest-impact remaining days with a heap instead of
+        sorting the whole semester. Returns (career_priority, buffer,
+        skip_safe), each in calendar order.
+        """
+        chosen = heapq.nlargest(gap, self.days, key=_rank) if gap > 0 else []
+        chosen_days = {s.day for s in chosen}
+        skip_safe = heapq.nsmallest(
+            SKIP_SAFE_LIMIT, (s for s in self.days if s.day not in chosen_days), key=_rank
+        )
+
+        chosen.sort(key=lambda s: s.day)
+        career = [s for s in chosen if self.is_career_day(s)]
+        buffer = [s for s in chosen if not self.is_career_day(s)]
+        skip_safe.sort(key=lambda s: s.day)
+        return career, buffer, skip_safe
+
+
+def cached_plan(key: Hashable, today: date) -> Optional[DatePlan]:
+    """
+    Cached DatePlan. `key` identifies the section, track, semester, events
+    version and subjects version; `today` is appended so plans roll over at
+    midnight.
+    """
+    cache_key = (key, today)
+    plan = _plan_cache.get(cache_key)
+    if plan is not None:
+        _plan_cache.move_to_end(cache_key)
+    return plan
+
+
+def store_plan(key: Hashable, today: date, plan: DatePlan) -> DatePlan:
+    _plan_cache[(key, today)] = plan
+    if len(_plan_cache) > MAX_CACHED_PLANS:
+        _plan_cache.popitem(last=False)
+    return plan
@@ -0,0 +1,161 @@
+"""
+Semester working-day calendar for EduPath Optimizer
+Builds an ordinal-indexed working-day bitmap once per semester window and
+serves range queries from it instead of re-walking the dates per request.
+With a table store configured, the bitmap is shared between worker
+processes through a memory-mapped file
+"""
+
+from collections import OrderedDict
+from datetime import date
+from typing import Hashable, Iterable, List, Optional, Sequence, Union
+import numpy as np
+
+from .busday import BusdayEngine
+from .calendar_store import CalendarStore
+from .holiday_registry import get_holiday_ordinals
+
+MAX_CACHED_CALENDARS = 32
+
+_calendar_cache: "OrderedDict[tuple, SemesterCalendar]" = OrderedDict()
+_table_store: Optional[CalendarStore] = None
+
+
+def _as_date(value: Union[date, str]) -> date:
+    """Accept both date objects and 'YYYY-MM-DD...' strings"""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value[:10])
+
+
+class SemesterCalendar:
+    """Working-day bitmap over [start, end], indexed by date ordinal"""
+
+    def __init__(self, start: date, end: date, public_holidays, fests: Iterable = (),
+                 bitmap: Optional[np.ndarray] = None):
+        self.start = start
+        self.end = end
+        self._base = start.toordinal()
+
+        if bitmap is not None:
+            # Precomputed (possibly memory-mapped, read-only) table
+            self._bitmap = bitmap
+        elif end < start:
+            self._bitmap = np.zeros(0, dtype=bool)
+        else:
+            # Holidays and fests are compiled into one busdaycalendar
+            blocked = set(public_holidays)
+            blocked.update(_as_date(f) for f in fests)
+            self._bitmap = BusdayEngine(blocked).mask(start, end)
+        # _prefix[i] = working days strictly before bitmap index i
+        self._prefix = np.zeros(len(self._bitmap) + 1, dtype=np.int32)
+        np.cumsum(self._bitmap, out=self._prefix[1:])
+
+    def __len__(self) -> int:
+        return len(self._bitmap)
+
+    def _index_range(self, start: Optional[date], end: Optional[date]):
+        """Clip [start, end] to the semester and return bitmap slice bounds"""
+        size = len(self._bitmap)
+        lo = 0 if start is None else min(size, max(0, start.toordinal() - self._base))
+        hi = size if end is None else min(size, end.toordinal() - self._base + 1)
+        return lo, max(lo, hi)
+
+    def is_working_day(self, day: date) -> bool:
+        idx = day.toordinal() - self._base
+        return 0 <= idx < len(self._bitmap) and bool(self._bitmap[idx])
+
+    def count(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Number of working days in [start, end] (clipped to the semester)"""
+        lo, hi = self._index_range(start, end)
+        return int(self._prefix[hi] - self._prefix[lo])
+
+    def remaining(self, from_day: date) -> int:
+        """Working days from `from_day` (inclusive) to the end of the semester"""
+        return self.count(from_day, None)
+
+    def working_ordinals(self) -> np.ndarray:
+        """Date ordinals of every working day in the semester"""
+        return self._base + np.flatnonzero(self._bitmap)
+
+    def count_in_sets(self, day_sets: Sequence[Iterable[date]], start: Optional[date] = None,
+                      end: Optional[date] = None) -> np.ndarray:
+        """
+        Distinct working days in [start, end] for every set of dates, computed
+        with one mask lookup over all sets (e.g. candidate leave plans).
+        """
+        lo, hi = self._index_range(start, end)
+        owners, offsets = [], []
+        for k, days in enumerate(day_sets):
+            for day in days:
+                owners.append(k)
+                offsets.append(day.toordinal() - self._base)
+        owners = np.asarray(owners, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+
+        inside = (offsets >= lo) & (offsets < hi)
+        owners, offsets = owners[inside], offsets[inside]
+        working = self._bitmap[offsets]
+        owners, offsets = owners[working], offsets[working]
+
+        # De-duplicate repeated dates within a set before counting
+        width = max(1, len(self._bitmap))
+        pairs = np.unique(owners * width + offsets)
+        return np.bincount(pairs // width, minlength=len(day_sets))
+
+    def working_days(self, start: Optional[date] = None, end: Optional[date] = None) -> List[date]:
+        """Working days in [start, end] (clipped to the semester), in order"""
+        lo, hi = self._index_range(start, end)
+        base = self._base + lo
+        return [date.fromordinal(base + int(i)) for i in np.flatnonzero(self._bitmap[lo:hi])]
+
+
+def get_calendar(country_code: str, start: date, end: date, fests: Iterable = (),
+                 version: Optional[Hashable] = None, subdiv: Optional[str] = None) -> SemesterCalendar:
+    """
+    Return the cached calendar for (country, subdivision, semester window, events version).
+
+    When no explicit events version is supplied, the set of fest dates itself
+    is used as the version so a changed event list never serves a stale bitmap.
+    """
+    fests = list(fests)
+    if version is None:
+        version = frozenset(_as_date(f) for f in fests)
+    key = (country_code, subdiv, start, end, version)
+
+    calendar = _calendar_cache.get(key)
+    if calendar is not None:
+        _calendar_cache.move_to_end(key)
+        return calendar
+
+    ordinals = get_holiday_ordinals(country_code, range(start.year, end.year + 1), subdiv)
+    public_holidays = [date.fromordinal(o) for o in ordinals]
+    bitmap = None
+    if _table_store is not None and end >= start:
+        blocked = set(public_holidays) | {_as_date(f) for f in fests}
+        bitmap = _table_store.load_or_build(
+            country_code, subdiv, start, end, version,
+            lambda: BusdayEngine(blocked).mask(start, end), blocked=blocked,
+        )
+    calendar = SemesterCalendar(start, end, public_holidays, fests, bitmap=bitmap)
+
+    _calendar_cache[key] = calendar
+    if len(_calendar_cache) > MAX_CACHED_CALENDARS:
+        _calendar_cache.popitem(last=False)
+    return calendar
+
+
+def configure_table_store(directory: Optional[str]) -> Optional[CalendarStore]:
+    """
+    Share calendar bitmaps between processes through memory-mapped files in
+    `directory` (None disables it). Call before the first get_calendar().
+    """
+    global _table_store
+    _table_store = CalendarStore(directory) if directory else None
+    clear_calendar_cache()
+    return _table_store
+
+
+def clear_calendar_cache():
+    """Drop every cached calendar (e.g. after a bulk event import)"""
+    _calendar_cache.clear()
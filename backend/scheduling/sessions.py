@@ -0,0 +1,95 @@
+"""
+Class-session expansion for EduPath Optimizer
+Turns a section's weekly timetable plus the semester calendar into one
+sorted array of session date ordinals per subject, so schedules are never
+re-derived with per-day loops
+"""
+
+from collections import OrderedDict, defaultdict
+from datetime import date
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+
+from .semester_calendar import SemesterCalendar
+
+MAX_CACHED_SCHEDULES = 128
+
+_schedule_cache: "OrderedDict[Hashable, SessionSchedule]" = OrderedDict()
+
+
+class SessionSchedule:
+    """Per-subject session ordinals for one section and semester"""
+
+    def __init__(self, calendar: SemesterCalendar, timetable: Dict[int, List[str]]):
+        self.timetable = {int(day): list(subjects or []) for day, subjects in timetable.items()}
+
+        working = calendar.working_ordinals()
+        weekdays = (working - 1) % 7  # date.fromordinal(1) is a Monday
+        self._working = working
+        self._weekdays = weekdays
+
+        # Sessions per weekday for every subject (a subject may repeat in a day)
+        per_weekday = defaultdict(lambda: np.zeros(7, dtype=np.int64))
+        for day, subjects in self.timetable.items():
+            for subject in subjects:
+                per_weekday[subject][day % 7] += 1
+        self._per_weekday = dict(per_weekday)
+
+        self._sessions: Dict[str, np.ndarray] = {
+            subject: np.repeat(working, counts[weekdays])
+            for subject, counts in per_weekday.items()
+        }
+
+    @property
+    def subjects(self) -> List[str]:
+        return sorted(self._sessions)
+
+    def sessions(self, subject: str) -> np.ndarray:
+        return self._sessions.get(subject, np.zeros(0, dtype=np.int64))
+
+    def total(self, subject: str) -> int:
+        return len(self.sessions(subject))
+
+    def held_before(self, subject: str, day: date) -> int:
+        """Sessions that took place strictly before `day`"""
+        return int(np.searchsorted(self.sessions(subject), day.toordinal(), side="left"))
+
+    def remaining_from(self, subject: str, day: date) -> int:
+        """Sessions on or after `day`"""
+        return self.total(subject) - self.held_before(subject, day)
+
+    def session_dates(self, subject: str) -> List[date]:
+        return [date.fromordinal(int(o)) for o in self.sessions(subject)]
+
+    def coverage(self, subjects: List[str], from_day: date) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Working-day ordinals on or after `from_day` and a (days x subjects)
+        matrix of how many sessions of each subject fall on each day.
+        """
+        start = int(np.searchsorted(self._working, from_day.toordinal(), side="left"))
+        weekdays = self._weekdays[start:]
+        zeros = np.zeros(7, dtype=np.int64)
+        per_weekday = np.stack([self._per_weekday.get(s, zeros) for s in subjects], axis=1) \
+            if subjects else np.zeros((7, 0), dtype=np.int64)
+        return self._working[start:], per_weekday[weekdays]
+
+    def subjects_on(self, day: date) -> List[str]:
+        return self.timetable.get(day.weekday(), [])
+
+
+def cached_schedule(key: Hashable) -> Optional[SessionSchedule]:
+    schedule = _schedule_cache.get(key)
+    if schedule is not None:
+        _schedule_cache.move_to_end(key)
+    return schedule
+
+
+def store_schedule(key: Hashable, schedule: SessionSchedule) -> SessionSchedule:
+    _schedule_cache[key] = schedule
+    if len(_schedule_cache) > MAX_CACHED_SCHEDULES:
+        _schedule_cache.popitem(last=False)
+    return schedule
+
+
+def clear_schedule_cache():
+    _schedule_cache.clear()
@@ -0,0 +1,59 @@
+"""
+Per-subject attendance solver for EduPath Optimizer
+Finds a small set of future days that lifts every subject over its own
+attendance threshold. One day covers several subjects, so this is a
+multi-cover problem; the greedy choice (most outstanding need covered per
+day) is vectorized over the whole days x subjects matrix
+"""
+
+from typing import NamedTuple
+import numpy as np
+
+
+class SolverResult(NamedTuple):
+    chosen_days: np.ndarray      # row indices into the coverage matrix, in calendar order
+    need: np.ndarray             # sessions each subject still needs
+    planned: np.ndarray          # sessions each subject gets from the chosen days
+    feasible: np.ndarray         # whether each subject can reach its target at all
+
+
+def sessions_needed(attended: np.ndarray, held: np.ndarray, remaining: np.ndarray,
+                    target_pct: float) -> np.ndarray:
+    """Minimum further sessions per subject so attended / (held + remaining) >= target"""
+    final_total = held + remaining
+    required = np.ceil(target_pct / 100 * final_total - 1e-9).astype(np.int64)
+    return np.maximum(0, required - attended)
+
+
+def solve(coverage: np.ndarray, need: np.ndarray) -> SolverResult:
+    """
+    Greedy multi-cover: repeatedly take the day covering the most remaining
+    need (earliest day on ties) until every subject is covered or no day
+    helps any more. Subjects needing more than their remaining sessions are
+    reported infeasible and simply get every remaining session.
+    """
+    coverage = np.asarray(coverage, dtype=np.int64)
+    need = np.asarray(need, dtype=np.int64)
+    available = coverage.sum(axis=0)
+    feasible = need <= available
+    residual = np.minimum(need, available)
+
+    open_days = np.ones(coverage.shape[0], dtype=bool)
+    chosen = []
+    while residual.any():
+        gain = np.minimum(coverage, residual).sum(axis=1)
+        gain[~open_days] = 0
+        best = int(np.argmax(gain))
+        if gain[best] == 0:
+            break
+        chosen.append(best)
+        open_days[best] = False
+        residual -= np.minimum(coverage[best], residual)
+
+    chosen_days = np.sort(np.asarray(chosen, dtype=np.int64))
+    planned = coverage[chosen_days].sum(axis=0) if len(chosen_days) else np.zeros_like(need)
+    return SolverResult(chosen_days, need, planned, feasible)
+
+
+def percentage(attended: float, total: float) -> float:
+    return round(attended / total * 100, 2) if total > 0 else 0.0
@@ -0,0 +1,80 @@
+"""
+Semester context shared by the optimizer, attendance and exam-strategy routers:
+semester window, campus holiday country, section identity and the cached
+per-section class-session schedule
+"""
+
+from datetime import date
+from typing import Optional
+from config import settings
+from scheduling.event_index import event_index
+from scheduling.semester_calendar import SemesterCalendar, get_calendar
+from scheduling.sessions import SessionSchedule, cached_schedule, store_schedule
+
+# In production, these come from a 'semester_config' collection
+SEMESTER_START = date(2026, 1, 1)
+SEMESTER_END = date(2026, 5, 30)
+
+SECTION_FIELDS = ("campus_id", "department_id", "semester", "section")
+
+
+def country_for(user: dict) -> str:
+    """Holiday country for the student's campus"""
+    campus_id = user.get("campus_id", settings.DEFAULT_CAMPUS_ID)
+    return settings.CAMPUS_COUNTRY_CODES.get(campus_id, settings.DEFAULT_COUNTRY_CODE)
+
+
+def section_key(user: dict) -> tuple:
+    """Students sharing this key share a timetable and therefore a date plan"""
+    return (
+        user.get("campus_id", settings.DEFAULT_CAMPUS_ID),
+        user.get("department_id") or user.get("department"),
+        user.get("semester"),
+        user.get("section"),
+    )
+
+
+def semester_calendar_for(user: dict, events_version: int, fest_dates) -> SemesterCalendar:
+    return get_calendar(country_for(user), SEMESTER_START, SEMESTER_END, fest_dates, version=events_version)
+
+
+async def load_timetable(db, user: dict) -> dict:
+    """
+    Weekly timetable for the student's section: day_index (0=Mon) → subjects.
+    Documents without section fields apply to everyone; section-specific
+    documents override them for the same day.
+    """
+    conditions = [
+        {"$or": [{field: value}, {field: {"$exists": False}}]}
+        for field, value in zip(SECTION_FIELDS, section_key(user)) if value is not None
+    ]
+    query = {"$and": conditions} if conditions else {}
+
+    docs = await db.timetables.find(query, {"_id": 0}).to_list(None)
+    docs.sort(key=lambda d: sum(field in d for field in SECTION_FIELDS))
+    return {
+        doc["day_index"]: doc.get("subjects") or []
+        for doc in docs
+        if doc.get("day_index") is not None
+    }
+
+
+async def find_student(db, student_id: str) -> Optional[dict]:
+    """Student profile from `students`, falling back to the login account in `users`"""
+    student = await db.students.find_one({"student_id": student_id})
+    if student is None:
+        student = await db.users.find_one({"username": student_id, "role": "student"})
+    return student
+
+
+async def section_schedule(db, user: dict, events_version: Optional[int] = None,
+                           fest_dates=None) -> SessionSchedule:
+    """Cached per-subject session arrays for the student's section"""
+    if events_version is None:
+        events_version, fest_dates = await event_index.snapshot(db)
+    key = (section_key(user), country_for(user), SEMESTER_START, SEMESTER_END, events_version)
+    schedule = cached_schedule(key)
+    if schedule is None:
+        calendar = semester_calendar_for(user, events_version, fest_dates)
+        schedule = store_schedule(key, SessionSchedule(calendar, await load_timetable(db, user)))
+    return schedule
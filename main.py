@@ -5,11 +5,12 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from datetime import date, timedelta, datetime
-import holidays
 import math
+from bisect import bisect_left
 from jose import JWTError, jwt
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
+from backend.scheduling.semester_calendar import get_calendar
 
 # ─────────────────────────────────────────────
 # 1. CONFIG & SECURITY
@@ -83,27 +84,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 # ─────────────────────────────────────────────
 def get_strategic_dates(start: date, end: date, country_code: str,
                         target_subjects: list, db_timetable: dict):
-    years = list(set([start.year, end.year]))
-    public_holidays = holidays.CountryHoliday(country_code, years=years)
-
     fest_cursor = fest_collection.find({})
     fest_dates = {
         datetime.strptime(f["date"], "%Y-%m-%d").date()
         for f in fest_cursor if "date" in f
     }
 
+    # Weekend/holiday/fest filtering is precomputed once per window
+    calendar = get_calendar(country_code, start, end, fest_dates)
+
     priority_days, general_days = [], []
-    current = start
-    while current <= end:
-        if (current.weekday() < 5
-                and current not in public_holidays
-                and current not in fest_dates):
-            day_subjects = db_timetable.get(current.weekday(), [])
-            if any(sub in target_subjects for sub in day_subjects):
-                priority_days.append(current)
-            else:
-                general_days.append(current)
-        current += timedelta(days=1)
+    for current in calendar.working_days():
+        day_subjects = db_timetable.get(current.weekday(), [])
+        if any(sub in target_subjects for sub in day_subjects):
+            priority_days.append(current)
+        else:
+            general_days.append(current)
 
     return priority_days, general_days, fest_dates
 
@@ -157,19 +153,21 @@ def calculate_strategy(data: AttendanceInput):
         if doc.get("day_index") is not None
     }
 
-    p_days, g_days, _ = get_strategic_dates(
+    p_days, g_days, fest_dates = get_strategic_dates(
         data.start_date, data.end_date,
         data.country_code, target_subjects, db_timetable
     )
-    total_working_count = len(p_days) + len(g_days)
+    # Cached calendar: totals are prefix-sum lookups
+    calendar = get_calendar(data.country_code, data.start_date, data.end_date, fest_dates)
+    total_working_count = calendar.count()
 
     required_total = math.ceil((data.target_percentage / 100) * total_working_count)
     gap = max(0, required_total - data.current_attended)
 
     today = date.today()
-    future_p = [d for d in p_days if d >= today]
-    future_g = [d for d in g_days if d >= today]
-    total_future_available = len(future_p) + len(future_g)
+    future_p = p_days[bisect_left(p_days, today):]
+    future_g = g_days[bisect_left(g_days, today):]
+    total_future_available = calendar.remaining(today)
 
     suggested_career_objs, suggested_buffer_objs = [], []
     if gap > 0:
@@ -309,16 +307,16 @@ async def student_strategy(current_user: dict = Depends(get_current_user)):
         if d.get("day_index") is not None
     }
 
-    p_days, g_days, _ = get_strategic_dates(start_d, end_d, "IN",
-                                             track_doc["subjects"], db_tt)
-    total_working = len(p_days) + len(g_days)
+    p_days, g_days, fest_dates = get_strategic_dates(start_d, end_d, "IN",
+                                                      track_doc["subjects"], db_tt)
+    total_working = get_calendar("IN", start_d, end_d, fest_dates).count()
     attended      = current_user.get("attended", 0)
     required      = math.ceil(0.75 * total_working)
     gap           = max(0, required - attended)
 
     today = date.today()
-    f_p   = [d for d in p_days if d >= today]
-    f_g   = [d for d in g_days if d >= today]
+    f_p   = p_days[bisect_left(p_days, today):]
+    f_g   = g_days[bisect_left(g_days, today):]
 
     suggested_p = [d.strftime("%d-%m-%Y") for d in f_p[:gap]]
     suggested_g = [d.strftime("%d-%m-%Y") for d in f_g[:max(0, gap - len(f_p))]]
@@ -1,10 +1,14 @@
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
-from datetime import datetime
+import sys
+from datetime import timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from attendance_store import ingest_attendance
+from semester import SEMESTER_START
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "edupath_db")
 
@@ -71,17 +75,24 @@ async def seed_presentation_data():
 
     await db.academic_performance.insert_many(rajesh_perf + priya_perf + amit_perf)
 
-    # 5. Seed actual attendance logs for precision
-    # CS101 for Rajesh (low attendance)
+    # 5. Seed actual attendance logs for precision, one class per working day
+    days = []
+    day = SEMESTER_START
+    while len(days) < 20:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day += timedelta(days=1)
+
     logs = []
-    for i in range(1, 21):
+    for i, day in enumerate(days, start=1):
+        # CS101 for Rajesh (low attendance)
         status = "present" if i <= 8 else "absent"
-        logs.append({"student_id": "2024001", "subject_code": "CS101", "status": status, "date": datetime.now()})
+        logs.append({"student_id": "2024001", "subject_code": "CS101", "status": status, "date": day})
         # CS101 for Amit (high attendance)
-        logs.append({"student_id": "2024003", "subject_code": "CS101", "status": "present", "date": datetime.now()})
+        logs.append({"student_id": "2024003", "subject_code": "CS101", "status": "present", "date": day})
 
-    if logs:
-        await db.attendance.insert_many(logs)
+    # Written like the API writes them, so the counters stay in step
+    await ingest_attendance(db, logs)
 
     print("✅ Presentation Data Ready!")
     print("👉 Use '2024001' to show a Critical Risk with a Prerequisite Bridge Gap.")
@@ -17,6 +17,18 @@ except ImportError:
     pass
 
 
+def _backend_module(name):
+    """Import a flat backend module (they use bare imports and load settings on import)"""
+    import importlib
+    import os
+    import sys
+    os.environ.setdefault("SECRET_KEY", "edge-case-suite-" + "x" * 32)
+    backend = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+    if backend not in sys.path:
+        sys.path.insert(0, backend)
+    return importlib.import_module(name)
+
+
 # ═════════════════════════════════════════════════════════════
 # PHASE 1: ATTENDANCE OPTIMIZATION - EDGE CASES
 # ═════════════════════════════════════════════════════════════
@@ -173,6 +185,243 @@ class TestPhase1AttendanceEdgeCases:
         
         print(f"✓ PASS: All holidays remaining - feasible: {feasible}")
 
+    def test_sessions_needed_per_subject(self):
+        """Sessions each subject still needs for 75%: safe, exact boundary and infeasible subjects"""
+        pytest.importorskip("numpy")
+        import numpy as np
+        from backend.scheduling.solver import sessions_needed
+
+        attended = np.array([30, 40, 10, 27])
+        held = np.array([40, 40, 20, 36])
+        remaining = np.array([10, 10, 10, 4])
+        need = sessions_needed(attended, held, remaining, 75)
+
+        # ceil(0.75 * 50) - 30, already safe, ceil(0.75 * 30) - 10, exactly 30 of 40
+        assert need.tolist() == [8, 0, 13, 3]
+        assert (need > remaining).tolist() == [False, False, True, False]
+        print(f"✓ PASS: Sessions needed per subject: {need.tolist()}")
+
+    def test_solver_covers_every_subject(self):
+        """Greedy multi-cover picks the fewest days, earliest on ties, and flags impossible subjects"""
+        pytest.importorskip("numpy")
+        import numpy as np
+        from backend.scheduling.solver import solve
+
+        # days x subjects: sessions of each subject held that day
+        coverage = np.array([
+            [1, 0, 0],
+            [1, 1, 0],
+            [0, 1, 1],
+            [1, 1, 1],
+        ])
+        result = solve(coverage, np.array([2, 1, 1]))
+        assert result.chosen_days.tolist() == [0, 3]
+        assert result.planned.tolist() == [2, 1, 1]
+        assert result.feasible.all()
+
+        result = solve(coverage, np.array([5, 0, 0]))
+        assert result.feasible.tolist() == [False, True, True]
+        assert result.chosen_days.tolist() == [0, 1, 3]
+        assert result.planned[0] == 3
+
+        result = solve(coverage, np.zeros(3, dtype=int))
+        assert len(result.chosen_days) == 0
+        assert result.planned.tolist() == [0, 0, 0]
+        print("✓ PASS: Solver covers every subject with the fewest days")
+
+    def test_longest_skippable_window(self):
+        """Longest block of calendar days within the skip budget, earliest on ties"""
+        pytest.importorskip("numpy")
+        import numpy as np
+        from backend.scheduling.leave_windows import Window, longest_skippable
+
+        working = np.array([1, 1, 0, 0, 1, 1, 1, 0, 0, 1])
+        career = np.array([0, 1, 0, 0, 0, 1, 0, 0, 0, 1])
+
+        assert longest_skippable(working, career, 1) == Window(1, 3, 1, 1)
+        assert longest_skippable(working, career, 0) == Window(2, 2, 0, 0)
+        assert longest_skippable(working, career, 10) == Window(0, 10, 6, 3)
+        assert longest_skippable(working, career, -1) is None
+        assert longest_skippable(np.array([], dtype=int), np.array([], dtype=int), 3) is None
+        assert longest_skippable(np.ones(3, dtype=int), np.zeros(3, dtype=int), 0) is None
+        print("✓ PASS: Longest skippable window")
+
+    def test_cheapest_leave_window(self):
+        """N-day window missing the fewest career sessions, staying within budget first"""
+        pytest.importorskip("numpy")
+        import numpy as np
+        from backend.scheduling.leave_windows import Window, cheapest_window
+
+        working = np.array([1, 1, 0, 0, 1, 1, 1, 0, 0, 1])
+        career = np.array([0, 1, 0, 0, 0, 1, 0, 0, 0, 1])
+        assert cheapest_window(working, career, 3, 1) == Window(2, 3, 1, 0)
+
+        # The only window within budget costs more career sessions than the others
+        assert cheapest_window(np.array([1, 1, 1, 0]), np.array([0, 0, 1, 1]), 2, 1) == Window(2, 2, 1, 2)
+
+        assert cheapest_window(working, career, 0, 1) is None
+        assert cheapest_window(working, career, 11, 1) is None
+        print("✓ PASS: Cheapest leave window")
+
+    def test_career_keyword_matching(self):
+        """Track keywords match at a word start (plurals included) and prefer the longest keyword"""
+        pytest.importorskip("pymongo")
+        from backend.scheduling.career_matcher import CAREER_SUBJECT_MAP, CareerMatcher, _compile
+
+        pattern = _compile(["ml", "machine learning", "net", "network"])
+        assert pattern.search("Intro to Machine Learning").group().lower() == "machine learning"
+        assert pattern.search("Computer Networks").group() == "Network"
+        assert pattern.search("HTML Basics") is None
+
+        matcher = CareerMatcher(CAREER_SUBJECT_MAP)
+        assert matcher.tracks_for_name("HTML and CSS") == {"Web Dev"}
+        assert matcher.tracks_for_name("Applied ML") == {"AI & ML"}
+        assert matcher.tracks_for_name("Network Security") == {"Cyber Security"}
+        assert matcher.tracks_for_name("Embedded Sensors and Python") == {"IOT", "AI & ML"}
+        assert matcher.tracks_for_name("Engineering Drawing") == frozenset()
+        print("✓ PASS: Career keyword matching")
+
+    def test_career_subject_tracks(self):
+        """Subject documents merge keyword tracks with stored career_tracks; lookups fall back from code to name"""
+        pytest.importorskip("pymongo")
+        from enum import Enum
+        from backend.scheduling.career_matcher import CAREER_SUBJECT_MAP, CareerMatcher
+
+        class Track(str, Enum):
+            IOT = "iot"
+
+        matcher = CareerMatcher(CAREER_SUBJECT_MAP)
+        matcher.load_subjects([
+            {"subject_code": "CS201", "subject_name": "Database Systems", "career_tracks": [Track.IOT, "ai_ml", "unknown"]},
+            {"subject_code": "CS202", "subject_name": "Engineering Drawing"},
+        ])
+        assert matcher.tracks_for("CS201") == {"Web Dev", "IOT", "AI & ML"}
+        assert matcher.tracks_for("CS202") == frozenset()
+        # Timetable entries that are names, or codes not in the subjects collection
+        assert matcher.tracks_for("Web Technologies") == {"Web Dev"}
+        assert matcher.tracks_for("CS999") == frozenset()
+        assert matcher.is_career_subject("CS201", "IOT")
+        assert not matcher.is_career_subject("CS202", "IOT")
+        print("✓ PASS: Career subject tracks")
+
+    def test_career_matcher_picks_up_other_workers_subjects(self):
+        """A subject added through one matcher reaches another once it re-checks the shared version"""
+        pytest.importorskip("pymongo")
+        from backend.scheduling.career_matcher import CAREER_SUBJECT_MAP, CareerMatcher
+
+        class Cursor:
+            def __init__(self, docs):
+                self.docs = docs
+
+            async def to_list(self, length):
+                return [dict(d) for d in self.docs]
+
+        class Subjects:
+            def __init__(self):
+                self.docs = []
+
+            def find(self, query, projection):
+                return Cursor(self.docs)
+
+        class Config:
+            def __init__(self):
+                self.version = 0
+
+            async def find_one(self, query):
+                return {"key": query["key"], "version": self.version}
+
+            async def find_one_and_update(self, query, update, upsert, return_document):
+                self.version += update["$inc"]["version"]
+                return {"key": query["key"], "version": self.version}
+
+        class Db:
+            subjects = Subjects()
+            config = Config()
+
+        db = Db()
+        worker_a = CareerMatcher(CAREER_SUBJECT_MAP, refresh_seconds=0)
+        worker_b = CareerMatcher(CAREER_SUBJECT_MAP, refresh_seconds=0)
+
+        async def scenario():
+            assert await worker_a.ensure_loaded(db) == 0
+            assert await worker_b.ensure_loaded(db) == 0
+            assert worker_b.tracks_for("CS301") == frozenset()
+
+            doc = {"subject_code": "CS301", "subject_name": "Applied Cryptography"}
+            db.subjects.docs.append(doc)
+            assert await worker_a.subject_added(db, doc) == 1
+            assert worker_a.tracks_for("CS301") == {"Cyber Security"}
+
+            assert await worker_b.ensure_loaded(db) == 1
+            assert worker_b.tracks_for("CS301") == {"Cyber Security"}
+
+        asyncio.run(scenario())
+        print("✓ PASS: Career matcher reloads on a new subjects version")
+
+    def test_session_schedule_expansion(self):
+        """Weekly timetable expanded over working days: repeats, held/remaining counts and coverage"""
+        pytest.importorskip("numpy")
+        from backend.scheduling.semester_calendar import SemesterCalendar
+        from backend.scheduling.sessions import SessionSchedule
+
+        # Mon 2 Mar - Sun 15 Mar 2026; Wed 4 Mar is a holiday, Tue 10 Mar a fest
+        calendar = SemesterCalendar(date(2026, 3, 2), date(2026, 3, 15), {date(2026, 3, 4)}, {"2026-03-10"})
+        timetable = {0: ["CS101", "CS101", "CS102"], 2: ["CS102"], 3: ["CS101"]}  # Mon, Wed, Thu
+        schedule = SessionSchedule(calendar, timetable)
+
+        assert schedule.subjects == ["CS101", "CS102"]
+        assert schedule.session_dates("CS101") == [date(2026, 3, 2), date(2026, 3, 2), date(2026, 3, 5),
+                                                   date(2026, 3, 9), date(2026, 3, 9), date(2026, 3, 12)]
+        assert schedule.session_dates("CS102") == [date(2026, 3, 2), date(2026, 3, 9), date(2026, 3, 11)]
+        assert schedule.total("CS999") == 0
+
+        assert schedule.held_before("CS101", date(2026, 3, 2)) == 0
+        assert schedule.held_before("CS101", date(2026, 3, 9)) == 3
+        assert schedule.remaining_from("CS101", date(2026, 3, 9)) == 3
+        assert schedule.held_before("CS102", date(2026, 3, 31)) == 3
+
+        days, coverage = schedule.coverage(["CS101", "CS102", "CS999"], date(2026, 3, 9))
+        assert [date.fromordinal(int(o)) for o in days] == [date(2026, 3, 9), date(2026, 3, 11),
+                                                            date(2026, 3, 12), date(2026, 3, 13)]
+        assert coverage.tolist() == [[2, 1, 0], [0, 1, 0], [1, 0, 0], [0, 0, 0]]
+        assert schedule.subjects_on(date(2026, 3, 9)) == ["CS101", "CS101", "CS102"]
+        print("✓ PASS: Session schedule expansion")
+
+    def test_date_plan_selection(self):
+        """Heap selection of high-impact days: ties, career/buffer split, oversized gaps and skip-safe days"""
+        pytest.importorskip("numpy")
+        from backend.scheduling.roadmap import DatePlan
+        from backend.scheduling.semester_calendar import SemesterCalendar
+
+        # Working days: Mon 2, Tue 3, Thu 5, Fri 6, Mon 9, Wed 11, Thu 12, Fri 13 March 2026
+        calendar = SemesterCalendar(date(2026, 3, 2), date(2026, 3, 15), {date(2026, 3, 4)}, {"2026-03-10"})
+        days = lambda scored: [s.day.day for s in scored]
+
+        # Timetable scores: Mon 4 (career + subject), Fri 3 (career), Thu 1, Tue/Wed 0
+        timetable = {0: ["ML Lab", "Maths"], 3: ["Maths"], 4: ["ML Lab"]}
+        plan = DatePlan(calendar, date(2026, 3, 2), timetable, lambda name: name == "ML Lab")
+        assert plan.total_working == 8 and plan.remaining_count == 8
+
+        career, buffer, skip_safe = plan.select(3)
+        assert days(career) == [2, 6, 9] and buffer == []  # Fri 6 beats Fri 13 on the tie
+        career, buffer, skip_safe = plan.select(5)
+        assert days(career) == [2, 6, 9, 13] and days(buffer) == [5]
+        assert days(skip_safe) == [3, 11, 12]
+
+        career, buffer, skip_safe = plan.select(20)
+        assert len(career) + len(buffer) == 8 and skip_safe == []
+        career, buffer, skip_safe = plan.select(0)
+        assert career == [] and buffer == [] and len(skip_safe) == 8
+
+        # No timetable: fixed career weekdays (Tue/Thu) score higher
+        plan = DatePlan(calendar, date(2026, 3, 2), None, career_weekdays=(1, 3))
+        career, buffer, skip_safe = plan.select(4)
+        assert days(career) == [3, 5, 12] and days(buffer) == [2]
+        assert not {s.day for s in skip_safe} & {s.day for s in career + buffer}
+
+        assert DatePlan(calendar, date(2026, 3, 9), timetable).remaining_count == 4
+        print("✓ PASS: Date plan selection")
+
 
 # ═════════════════════════════════════════════════════════════
 # PHASE 2: EXAM STRATEGY - EDGE CASES
@@ -606,6 +855,165 @@ class TestPerformanceEdgeCases:
         assert len(results) == calls
         print(f"✓ PASS: Handled {calls} rapid API calls")
 
+    def test_prefix_sum_working_days_benchmark(self):
+        """Benchmark prefix-sum working-day counts against the day-by-day loop (1 year)"""
+        pytest.importorskip("numpy")
+        pytest.importorskip("holidays")
+        from backend.scheduling.semester_calendar import SemesterCalendar
+        import timeit
+
+        start, end = date(2026, 1, 1), date(2026, 12, 31)
+        public_holidays = {date(2026, 1, 26), date(2026, 8, 15), date(2026, 10, 2)}
+        fests = {"2026-02-10", "2026-03-20"}
+        calendar = SemesterCalendar(start, end, public_holidays, fests)
+
+        def loop_count(a, b):
+            count, current = 0, a
+            while current <= b:
+                if (current.weekday() < 5 and current not in public_holidays
+                        and current.strftime("%Y-%m-%d") not in fests):
+                    count += 1
+                current += timedelta(days=1)
+            return count
+
+        queries = [(start + timedelta(days=i), end) for i in range(0, 365, 15)]
+        for a, b in queries:
+            assert calendar.count(a, b) == loop_count(a, b)
+
+        loop_time = timeit.timeit(lambda: [loop_count(a, b) for a, b in queries], number=10)
+        prefix_time = timeit.timeit(lambda: [calendar.count(a, b) for a, b in queries], number=10)
+
+        assert prefix_time < loop_time
+        print(f"✓ PASS: 1-year range counts - loop {loop_time * 1000:.1f}ms, "
+              f"prefix sums {prefix_time * 1000:.1f}ms ({loop_time / prefix_time:.0f}x faster)")
+
+    def test_packed_attendance_round_trip(self):
+        """Bitmap attendance: set/status, exceptions, overwrite and expand back to per-day rows"""
+        pytest.importorskip("bson")
+        pytest.importorskip("pydantic_settings")
+        from enum import Enum
+        attendance_bitmap = _backend_module("attendance_bitmap")
+
+        class Status(str, Enum):
+            PRESENT = "present"
+
+        doc = {"_id": "b1", "student_id": "2024001", "subject_code": "CS101", "term_start": "2026-01-01"}
+        packed = attendance_bitmap.PackedAttendance(None)
+        packed.set(0, Status.PRESENT)
+        packed.set(5, "absent")
+        packed.set(40, "holiday")
+        packed.set(70, "present")
+        assert packed.status(1) is None
+        doc.update(packed.update()["$set"])
+
+        stored = attendance_bitmap.PackedAttendance(doc)
+        assert stored.version == 1
+        assert stored.offsets() == [0, 5, 40, 70]
+        assert [stored.status(o) for o in (0, 5, 40, 70)] == ["present", "absent", "holiday", "present"]
+        assert attendance_bitmap.totals(doc) == (4, 2)
+
+        # Overwrites clear stale bits and exceptions
+        stored.set(0, "absent")
+        stored.set(40, "present")
+        doc.update(stored.update()["$set"])
+        assert doc["exceptions"] == {}
+        assert attendance_bitmap.totals(doc) == (4, 2)
+
+        rows = attendance_bitmap.expand(doc)
+        assert [(r["date"], r["status"]) for r in rows] == [
+            ("2026-01-01", "absent"), ("2026-01-06", "absent"),
+            ("2026-02-10", "present"), ("2026-03-12", "present"),
+        ]
+        assert rows[0]["id"] == "b1:0" and rows[0]["subject_code"] == "CS101"
+        print("✓ PASS: Packed attendance round trip")
+
+    def test_calendar_table_store(self, tmp_path):
+        """Shared calendar tables: built once, mapped read-only, old versions pruned, private fallback"""
+        np = pytest.importorskip("numpy")
+        from backend.scheduling.calendar_store import CalendarStore
+
+        start, end = date(2026, 1, 1), date(2026, 1, 5)
+        table = np.array([True, False, False, True, True])
+        builds = []
+
+        def build():
+            builds.append(1)
+            return table
+
+        store = CalendarStore(tmp_path / "tables")
+        first = store.load_or_build("IN", None, start, end, 1, build, blocked={date(2026, 1, 2)})
+        again = store.load_or_build("IN", None, start, end, 1, build, blocked={date(2026, 1, 2)})
+        assert len(builds) == 1
+        assert isinstance(again, np.memmap) and not again.flags.writeable
+        assert first.tolist() == again.tolist() == table.tolist()
+
+        # Another window is kept; a new holiday set or events version replaces the old file
+        store.load_or_build("IN", None, start, date(2026, 1, 4), 1, lambda: table[:4])
+        store.load_or_build("IN", None, start, end, 1, build, blocked={date(2026, 1, 3)})
+        assert len(builds) == 2
+        store.load_or_build("IN", None, start, end, 2, build, blocked={date(2026, 1, 3)})
+        assert len(builds) == 3
+        files = sorted(p.name for p in (tmp_path / "tables").iterdir())
+        assert len(files) == 2 and all(name.endswith(".npy") for name in files)
+        assert store.path_for("IN", None, start, end, 2, {date(2026, 1, 3)}).name in files
+        assert (store.path_for("IN", None, start, end, 1, {date(2026, 1, 2)}).name
+                != store.path_for("IN", None, start, end, 1, {date(2026, 1, 3)}).name)
+
+        # Unwritable directory: fall back to a private in-memory table
+        (tmp_path / "blocker").write_text("not a directory")
+        private = CalendarStore(tmp_path / "blocker" / "tables").load_or_build("IN", None, start, end, 1, build)
+        assert not isinstance(private, np.memmap) and private.tolist() == table.tolist()
+        print("✓ PASS: Calendar table store")
+
+    def test_attendance_write_behind_buffer(self):
+        """Clicks coalesce per key; clicks during a flush and rows from a failed flush still get written"""
+        pytest.importorskip("pymongo")
+        pytest.importorskip("pydantic_settings")
+        attendance_buffer = _backend_module("attendance_buffer")
+        writes, failures = [], [1]
+
+        async def slow_ingest(db, rows):
+            await asyncio.sleep(0.05)
+            if failures:
+                failures.pop()
+                raise RuntimeError("database unavailable")
+            writes.append(sorted((r["student_id"], r["status"]) for r in rows))
+
+        def click(student_id, status):
+            return {"student_id": student_id, "subject_code": "CS101", "date": "2026-03-02", "status": status}
+
+        async def scenario():
+            buffer = attendance_buffer.AttendanceBuffer(window_seconds=0.01)
+            await buffer.write(None, click("2024001", "present"))
+            await buffer.write(None, click("2024001", "absent"))
+            await buffer.write(None, click("2024002", "present"))
+            assert len(buffer) == 2
+            await asyncio.sleep(0.03)  # first flush is in flight (and will fail)
+            await buffer.write(None, click("2024003", "present"))
+            await asyncio.sleep(0.3)
+            assert len(buffer) == 0
+            await buffer.write(None, click("2024004", "absent"), sync=True)
+
+            # Shutdown while the timer's flush is in flight still writes the click
+            await buffer.write(None, click("2024005", "present"))
+            await asyncio.sleep(0.03)
+            await buffer.close()
+            assert len(buffer) == 0
+
+        original = attendance_buffer.ingest_attendance
+        attendance_buffer.ingest_attendance = slow_ingest
+        try:
+            asyncio.run(scenario())
+        finally:
+            attendance_buffer.ingest_attendance = original
+
+        assert writes == [
+            [("2024001", "absent"), ("2024002", "present"), ("2024003", "present")],
+            [("2024004", "absent")],
+            [("2024005", "present")],
+        ]
+        print("✓ PASS: Write-behind buffer coalesces, retries and drains")
+
 
 # ═════════════════════════════════════════════════════════════
 # RUN TESTS
@@ -632,6 +1040,15 @@ if __name__ == "__main__":
     test_phase1.test_weekend_holiday_overlap()
     test_phase1.test_career_track_with_no_subjects()
     test_phase1.test_attendance_with_all_holidays_remaining()
+    test_phase1.test_sessions_needed_per_subject()
+    test_phase1.test_solver_covers_every_subject()
+    test_phase1.test_longest_skippable_window()
+    test_phase1.test_cheapest_leave_window()
+    test_phase1.test_career_keyword_matching()
+    test_phase1.test_career_subject_tracks()
+    test_phase1.test_career_matcher_picks_up_other_workers_subjects()
+    test_phase1.test_session_schedule_expansion()
+    test_phase1.test_date_plan_selection()
     
     # Phase 2
     print("\n📚 PHASE 2: EXAM STRATEGY - EDGE CASES")
@@ -684,6 +1101,12 @@ if __name__ == "__main__":
     test_perf.test_50_subjects_per_student()
     test_perf.test_date_range_full_semester()
     test_perf.test_rapid_api_calls()
+    test_perf.test_prefix_sum_working_days_benchmark()
+    test_perf.test_packed_attendance_round_trip()
+    import pathlib
+    import tempfile
+    test_perf.test_calendar_table_store(pathlib.Path(tempfile.mkdtemp()))
+    test_perf.test_attendance_write_behind_buffer()
     
     print("\n" + "="*70)
     print("✅ ALL EDGE CASE TESTS COMPLETED SUCCESSFULLY")